@@ -60,9 +60,48 @@ class ArgParser(object):
                             help="stft frame length")
         parser.add_argument('--stft_hop', default=256, type=int,
                             help="stft hop length")
+        parser.add_argument('--stft_cache', default='',
+                            help="directory to cache val/test STFTs in")
+        parser.add_argument('--stft_cache_prune', default=0, type=int,
+                            help="delete --stft_cache entries built with other STFT "
+                                 "arguments (make sure no other run is using them)")
+        parser.add_argument('--stft_cache_phase', default='float16',
+                            choices=['float16', 'uint8', 'uint16'],
+                            help="storage type of the cached phase")
+        parser.add_argument('--gpu_stft', default=0, type=int,
+                            help="datasets return waveforms only and the STFT/ISTFT "
+                                 "runs batched on the training device")
 
+        parser.add_argument('--audio_store', default='',
+                            help="prefix of a pre-resampled audio store "
+                                 "(see preprocessing/build_audio_store.py)")
+        parser.add_argument('--audio_seek', default=0, type=int,
+                            help="decode only the cropped audio window (plus "
+                                 "resampler padding) instead of the whole file")
+
+        parser.add_argument('--frame_features', default='',
+                            help="prefix of precomputed frame embeddings "
+                                 "(see preprocessing/extract_frame_features.py), "
+                                 "datasets then return embeddings instead of pixels")
+        parser.add_argument('--frames_det', default=0, type=int,
+                            help='MUSIC: crop frames to the best detection box')
+        parser.add_argument('--det_index', default='',
+                            help="prefix of a frame id -> box index "
+                                 "(see preprocessing/build_det_index.py)")
         parser.add_argument('--imgSize', default=224, type=int,
                             help='size of input frame')
+        parser.add_argument('--tensor_transform', default=0, type=int,
+                            help='transform each clip as one stacked uint8 tensor '
+                                 'instead of frame by frame with PIL')
+        parser.add_argument('--jpeg_draft', default=0, type=int,
+                            help='decode JPEG frames at a reduced DCT scale close '
+                                 'to 1.1x imgSize instead of full resolution')
+        parser.add_argument('--frame_pack', default=0, type=int,
+                            help='read frames from <frame_dir>.fpk packs '
+                                 '(see preprocessing/pack_frames.py)')
+        parser.add_argument('--frame_select', default='all', choices=['all', 'consumed'],
+                            help="'consumed': load only the frames the frame net "
+                                 "uses (the first one for resnet18, all for clip)")
         parser.add_argument('--frameRate', default=8, type=float,
                             help='video frame sampling rate')
 
@@ -83,6 +122,33 @@ class ArgParser(object):
                             help='steps for forward process')
         parser.add_argument('--num_sample_timesteps', type=int, default=300,
                             help='steps for backward process')
+        parser.add_argument('--fm_solver', default='euler',
+                            choices=['euler', 'midpoint', 'heun', 'rk4', 'dopri5'],
+                            help='ODE solver of the flow-matching sampler '
+                                 '(see diffusion_utils/flow_solvers.py)')
+        parser.add_argument('--nfe_steps', type=int, default=2,
+                            help='flow-matching solver steps (dopri5: initial step 1/nfe_steps)')
+        parser.add_argument('--fm_rtol', type=float, default=1e-3,
+                            help='dopri5 relative tolerance')
+        parser.add_argument('--fm_atol', type=float, default=1e-3,
+                            help='dopri5 absolute tolerance')
+        parser.add_argument('--sample_t_start', type=float, default=0.,
+                            help='truncated start: begin sampling at this flow time in [0, 1) '
+                                 '(0 = pure noise) from the mixture instead of noise')
+        parser.add_argument('--train_t_start', type=float, default=0.,
+                            help='train only on times the --sample_t_start sampler visits')
+        parser.add_argument('--cfg_dropout', type=float, default=0.,
+                            help='train the unconditional branch used by --guidance_scale: '
+                                 'drop the mixture and visual condition with this probability')
+        parser.add_argument('--guidance_scale', type=float, default=1.,
+                            help='classifier-free guidance scale at sampling, 1 disables it '
+                                 '(the model should be trained with --cfg_dropout)')
+        parser.add_argument('--precompute_condition', default=0, type=int,
+                            help='compute the mixture half of init_conv and the visual '
+                                 'half of the mid block once per sample instead of every step')
+        parser.add_argument('--compile_schedule', default=0, type=int,
+                            help='precompute the Unet time conditioning for the fixed '
+                                 'sampling schedule (DDIM and fixed-step ODE solvers)')
 
         self.parser = parser
 
@@ -95,8 +161,17 @@ class ArgParser(object):
                             default='data/train.csv')
         parser.add_argument('--list_val',
                             default='data/val.csv')
+        parser.add_argument('--quarantine', default='',
+                            help='sqlite file recording samples that failed to '
+                                 'load; they are skipped in later epochs and runs')
+        parser.add_argument('--eval_store', default='',
+                            help='directory of val/test items written by '
+                                 'preprocessing/materialize_eval.py')
         parser.add_argument('--dup_trainset', default=40, type=int,
                             help='duplicate so that one epoch has more iters')
+        parser.add_argument('--batch_mix', default=0, type=int,
+                            help='MUSIC/AVE: load solo clips and form the train '
+                                 'mixtures from distinct classes inside each batch')
 
         # optimization related arguments
         parser.add_argument('--num_epoch', default=100, type=int,
@@ -122,5 +197,8 @@ class ArgParser(object):
     def parse_train_arguments(self):
         self.add_train_arguments()
         args = self.parser.parse_args()
+        for name in ['sample_t_start', 'train_t_start']:
+            if not 0. <= getattr(args, name) < 1.:
+                self.parser.error('--{} must be in [0, 1)'.format(name))
         self.print_arguments(args)
         return args
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset.base import BaseDataset
+
+
+# _load_audio on wav files of increasing length: full decode + resample +
+# crop vs. --audio_seek (windowed sf.read of the crop plus resampler padding).
+# Reports items/s and the max abs difference of the returned windows.
+# python benchmarks/bench_audio_seek.py --lengths 5 30 120 600 --rate 44100
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--lengths', nargs='+', default=[5, 30, 120, 600], type=float,
+                               help='file lengths in seconds')
+    parser.parser.add_argument('--rate', default=44100, type=int)
+    parser.parser.add_argument('--num_items', default=20, type=int)
+    args = parser.parser.parse_args()
+
+    args.audio_seek = 0
+    full = BaseDataset([], args, split='val')
+    args.audio_seek = 1
+    seek = BaseDataset([], args, split='val')
+
+    tmp = tempfile.mkdtemp()
+    rng = np.random.RandomState(args.seed)
+    print('{:>8} {:>12} {:>12} {:>8} {:>10}'.format('seconds', 'full it/s', 'seek it/s', 'speedup', 'max diff'))
+    try:
+        for length in args.lengths:
+            path = os.path.join(tmp, '{}.wav'.format(length))
+            sf.write(path, (rng.rand(int(length * args.rate), 2) - 0.5).astype(np.float32) * 0.5,
+                     args.rate, subtype='PCM_16')
+            centers = rng.uniform(0, length, args.num_items)
+
+            tic = time.perf_counter()
+            ref = [full._load_audio(path, c) for c in centers]
+            t_full = time.perf_counter() - tic
+            tic = time.perf_counter()
+            out = [seek._load_audio(path, c) for c in centers]
+            t_seek = time.perf_counter() - tic
+
+            diff = max(np.abs(a - b).max() for a, b in zip(out, ref))
+            print('{:8.0f} {:12.1f} {:12.1f} {:7.1f}x {:10.2e}'.format(
+                length, len(centers) / t_full, len(centers) / t_seek, t_full / t_seek, diff))
+    finally:
+        shutil.rmtree(tmp)
@@ -0,0 +1,36 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset.base import BaseDataset
+
+
+# compares _load_audio throughput: decode + resample vs. memory-mapped store
+# python benchmarks/bench_audio_store.py --audio_store /path/to/store --num_items 200
+def bench(dataset, keys, centers):
+    tic = time.perf_counter()
+    for key, center in zip(keys, centers):
+        dataset._load_audio(key, center)
+    return time.perf_counter() - tic
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--num_items', default=200, type=int)
+    args = parser.parser.parse_args()
+    assert args.audio_store, '--audio_store is required'
+
+    dataset_store = BaseDataset([], args, split='val')
+    store = dataset_store.audio_store
+    keys = list(store.keys())[:args.num_items]
+    centers = [store.index[k][1] / 2. / args.audRate for k in keys]
+
+    args.audio_store = ''
+    dataset_decode = BaseDataset([], args, split='val')
+
+    for name, dataset in [('decode+resample', dataset_decode), ('audio store', dataset_store)]:
+        elapsed = bench(dataset, keys, centers)
+        print('{:16} {:8.1f} items/s {:12.0f} samples/s'.format(
+            name, len(keys) / elapsed, len(keys) * args.audLen / elapsed))
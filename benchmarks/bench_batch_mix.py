@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset import MUSICMixDataset, AVEMixDataset
+from dataset.batch_mix import BatchMixCollate
+from dataset.sample_list import VirtualEpochSampler
+
+
+# Train data-loading throughput: per-item mixing (num_mix clip loads per
+# mixture) vs. --batch_mix (one clip load per mixture, partners paired inside
+# the batch). Reports mixtures/s, decoded clips per mixture and the number of
+# distinct class combinations seen.
+# python benchmarks/bench_batch_mix.py --dataset music --list_train data/train.csv --workers 16 --num_batches 50
+def run(dataset, args):
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=args.batch_size, num_workers=int(args.workers),
+        sampler=VirtualEpochSampler(len(dataset), 1, args.seed), drop_last=True,
+        collate_fn=BatchMixCollate(args) if dataset.batch_mix else None)
+    mixtures, combos = 0, set()
+    tic = time.perf_counter()
+    for i, batch in enumerate(loader):
+        if i == args.num_batches:
+            break
+        if batch is None:
+            continue
+        classes = batch['class'] if 'class' in batch else None
+        mixtures += batch['audio_mix'].size(0)
+        if classes is not None:
+            combos.update(frozenset(c) for c in zip(*classes))
+    elapsed = time.perf_counter() - tic
+    clips = args.num_batches * args.batch_size * (1 if dataset.batch_mix else args.num_mix)
+    return mixtures / elapsed, clips / float(max(mixtures, 1)), len(combos)
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.add_train_arguments()
+    parser.parser.add_argument('--dataset', default='music', choices=['music', 'ave'])
+    parser.parser.add_argument('--num_batches', default=50, type=int)
+    args = parser.parser.parse_args()
+    args.batch_size = args.batch_size_per_gpu
+    Dataset = MUSICMixDataset if args.dataset == 'music' else AVEMixDataset
+
+    print('{:10} {:>12} {:>16} {:>14}'.format('mode', 'mixtures/s', 'clips/mixture', 'class combos'))
+    for batch_mix in [0, 1]:
+        args.batch_mix = batch_mix
+        dataset = Dataset(args.list_train, args, split='train')
+        rate, clips, combos = run(dataset, args)
+        print('{:10} {:12.1f} {:16.2f} {:14d}'.format(
+            'batch_mix' if batch_mix else 'per-item', rate, clips, combos))
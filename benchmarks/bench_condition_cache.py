@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from modules import models
+from diffusion_utils import flow_solvers
+
+
+# Equivalence and speed of Unet.precompute_condition: the steps of a
+# fixed-step flow-matching solve (--fm_solver/--nfe_steps) with the full
+# condition vs. with the mixture half of init_conv and the visual half of
+# mid_block1 computed once. Exits non-zero if the outputs differ by more
+# than --atol.
+# python benchmarks/bench_condition_cache.py --batch_size_per_gpu 8 --fm_solver heun --nfe_steps 4
+def run(net, x, times, condition, args):
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    for _ in range(args.repeat):
+        if len(condition) > 3:
+            # the precompute is part of every sample
+            condition = condition[:3] + [net.precompute_condition(condition)]
+        outs = [net(x, torch.full((x.shape[0],), t, device=x.device) * 1000, condition) for t in times]
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - tic) / args.repeat, outs
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--repeat', default=5, type=int)
+    parser.parser.add_argument('--atol', default=1e-4, type=float)
+    args = parser.parser.parse_args()
+    args.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    torch.manual_seed(args.seed)
+    B = args.batch_size_per_gpu
+
+    net = models.ModelBuilder().build_unet().to(args.device).eval()
+    mix = torch.rand(B, 1, 256, 256, device=args.device)
+    condition = [mix, torch.randn(B, 512, 1, device=args.device), mix]
+    x = torch.randn(B, 1, 256, 256, device=args.device)
+    times = flow_solvers.stage_times(args.fm_solver, 0., 1., args.nfe_steps)
+
+    with torch.no_grad():
+        run(net, x, times[:1], condition, args)
+        t_ref, ref = run(net, x, times, condition, args)
+        t_cached, out = run(net, x, times, condition + [None], args)
+
+    diff = max((a - b).abs().max().item() for a, b in zip(out, ref))
+    print('{} steps of {}: full condition {:.1f} ms, precomputed {:.1f} ms, speedup {:.2f}x'.format(
+        len(times), args.fm_solver, t_ref * 1e3, t_cached * 1e3, t_ref / t_cached))
+    print('max |diff| {:.3e}'.format(diff))
+    if diff > args.atol:
+        sys.exit('precomputed condition differs from the full forward by {:.3e}'.format(diff))
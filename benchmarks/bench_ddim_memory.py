@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from modules import models
+from diffusion_utils import diffusion_pytorch
+
+
+# Peak CUDA memory and time of one DDIM run over a batch of 256x256 mixtures:
+# the old return_all_timesteps=True call (keeping preds[:, -1]) vs. the
+# streaming sampler, for several sampling_timesteps. Also checks that both
+# return the same image given the same noise.
+# python benchmarks/bench_ddim_memory.py --batch_size_per_gpu 16 --steps 15 50 100
+def run(sampler, condition, noise, record):
+    torch.cuda.synchronize()
+    torch.cuda.reset_peak_memory_stats()
+    base = torch.cuda.memory_allocated()
+    tic = time.perf_counter()
+    if record:
+        out = sampler.ddim_sample(condition, noise.shape[1:], return_all_timesteps=True, noise=noise)[:, -1]
+    else:
+        out = sampler.ddim_sample(condition, noise.shape[1:], noise=noise)
+    torch.cuda.synchronize()
+    return time.perf_counter() - tic, torch.cuda.max_memory_allocated() - base, out
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--steps', default=[15, 50, 100], type=int, nargs='+')
+    args = parser.parser.parse_args()
+    if not torch.cuda.is_available():
+        sys.exit('bench_ddim_memory.py measures CUDA memory and needs a GPU')
+    device = torch.device('cuda')
+    torch.manual_seed(args.seed)
+    B = args.batch_size_per_gpu
+
+    net = models.ModelBuilder().build_unet().to(device).eval()
+    mix = torch.rand(B, 1, 256, 256, device=device)
+    feat = torch.randn(B, 512, 1, device=device)
+
+    print('{:>6} {:>14} {:>14} {:>10} {:>10} {:>10}'.format(
+        'steps', 'history MiB', 'stream MiB', 'history s', 'stream s', 'max diff'))
+    for steps in args.steps:
+        sampler = diffusion_pytorch.GaussianDiffusion(
+            net, image_size=256, timesteps=1000, sampling_timesteps=steps, loss_type='l1',
+            objective='pred_noise', beta_schedule='sigmoid', ddim_sampling_eta=1.,
+            auto_normalize=False, min_snr_loss_weight=False).to(device)
+        noise = torch.randn(steps + 1, B, 1, 256, 256, device=device)
+        t_hist, m_hist, ref = run(sampler, [mix, feat], noise, True)
+        t_stream, m_stream, out = run(sampler, [mix, feat], noise, False)
+        print('{:6d} {:14.1f} {:14.1f} {:10.2f} {:10.2f} {:10.2e}'.format(
+            steps, m_hist / 2**20, m_stream / 2**20, t_hist, t_stream, (out - ref).abs().max().item()))
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.array_store import ArrayStore
+from dataset.base import best_box
+
+
+# Box lookup of the detection-cropped MUSIC path (_load_frames_det), without
+# the image decode: per-item np.load + where/argmax per frame vs. the dense
+# index from preprocessing/build_det_index.py. Checks that both pick the
+# same boxes.
+# python benchmarks/bench_det_index.py --det_root /YOUR_ROOT/MUSIC/detection_results --det_index cache/det_index
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--det_root', required=True)
+    parser.add_argument('--det_index', required=True)
+    parser.add_argument('--num_items', default=2000, type=int)
+    parser.add_argument('--num_frames', default=3, type=int)
+    args = parser.parse_args()
+
+    index = ArrayStore(args.det_index)
+    paths = []
+    for dirpath, _, filenames in os.walk(args.det_root):
+        paths += [os.path.normpath(os.path.join(dirpath, f)) for f in filenames if f.endswith('.npy')]
+    paths = [p for p in paths if p in index]
+    random.seed(0)
+    items = []
+    for _ in range(args.num_items):
+        path = random.choice(paths)
+        items.append((path, [random.randint(0, len(index[path]) - 1) for _ in range(args.num_frames)]))
+
+    tic = time.perf_counter()
+    ref = []
+    for path, ids in items:
+        det_res = np.load(path)
+        ref.append([best_box(det_res, i) for i in ids])
+    t_load = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    out = []
+    for path, ids in items:
+        table = index[path]
+        out.append([table[i] for i in ids])
+    t_index = time.perf_counter() - tic
+
+    mismatch = 0
+    for boxes_ref, boxes in zip(ref, out):
+        for a, b in zip(boxes_ref, boxes):
+            if a is None:
+                mismatch += not np.isnan(b[0])
+            else:
+                mismatch += not np.array_equal(np.asarray(a[:4], dtype=np.float64), b)
+    print('{} items x {} frames from {} videos'.format(len(items), args.num_frames, len(paths)))
+    print('np.load+argmax {:10.1f} items/s'.format(len(items) / t_load))
+    print('index          {:10.1f} items/s ({:.1f}x), {} boxes differ'.format(
+        len(items) / t_index, t_load / t_index, mismatch))
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset import MuddyMixDataset
+from dataset.materialized import MaterializedDataset
+from modules import models
+from main_fm_muddy import NetWrapper, calc_metrics, error_avoidance_collate
+
+
+# Speed vs. separation quality of the flow-matching ODE solvers on the
+# Muddy_Mix validation loader: SDR/SIR/SAR, network evaluations (NFE) per
+# clip and wall time per clip for every solver:steps pair. All pairs start
+# from the same noise.
+# python benchmarks/bench_fm_solvers.py --weights_unet ckpt/unet_best.pth --weights_frame ckpt/frame_best.pth \
+#     --list_val valid_muddy_mix_audios_val.csv --configs euler:2 euler:8 heun:4 rk4:2 dopri5:2 --num_batches 50
+def run(wrapper, loader, args):
+    torch.manual_seed(args.seed)
+    metrics, nfe, clips, elapsed = [], 0, 0, 0.
+    for i, batch_data in enumerate(loader):
+        if i >= args.num_batches:
+            break
+        if batch_data is None:
+            continue
+        if args.device.type == 'cuda':
+            torch.cuda.synchronize()
+        tic = time.perf_counter()
+        outputs = wrapper.sample(batch_data, args)
+        if args.device.type == 'cuda':
+            torch.cuda.synchronize()
+        elapsed += time.perf_counter() - tic
+        metrics.append(calc_metrics(batch_data, outputs, args)[1:])
+        # the batch is integrated jointly, every clip sees each evaluation
+        nfe += outputs['nfe'] * batch_data['audio_mix'].size(0)
+        clips += batch_data['audio_mix'].size(0)
+    return np.mean(metrics, axis=0), nfe / clips, elapsed / clips
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.add_train_arguments()
+    parser.parser.add_argument('--data_root', default='/home/prj/data/Muddy_Mix')
+    parser.parser.add_argument('--configs', default=['euler:2', 'midpoint:2', 'heun:2', 'rk4:2', 'dopri5:2'],
+                               nargs='+', help='solver:steps pairs')
+    parser.parser.add_argument('--num_batches', default=50, type=int)
+    args = parser.parser.parse_args()
+    args.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    args.batch_size = args.batch_size_per_gpu
+
+    builder = models.ModelBuilder()
+    nets = (builder.build_visual(pool_type=args.img_pool, weights=args.weights_frame,
+                                 arch_frame=args.arch_frame),
+            builder.build_unet(weights=args.weights_unet))
+    wrapper = NetWrapper(nets).to(args.device).eval()
+
+    if args.eval_store:
+        dataset_val = MaterializedDataset(args.eval_store, args, max_sample=args.num_val)
+    else:
+        dataset_val = MuddyMixDataset(args.data_root, args.list_val, args,
+                                      max_sample=args.num_val, split='val')
+    loader = torch.utils.data.DataLoader(
+        dataset_val, batch_size=args.batch_size, shuffle=False,
+        num_workers=int(args.workers), collate_fn=error_avoidance_collate)
+
+    print('{:>12} {:>8} {:>8} {:>8} {:>10} {:>10}'.format(
+        'solver', 'SDR', 'SIR', 'SAR', 'NFE/clip', 'ms/clip'))
+    with torch.no_grad():
+        for config in args.configs:
+            args.fm_solver, steps = config.split(':')
+            args.nfe_steps = int(steps)
+            (sdr, sir, sar), nfe, seconds = run(wrapper, loader, args)
+            print('{:>12} {:8.2f} {:8.2f} {:8.2f} {:10.1f} {:10.1f}'.format(
+                config, sdr, sir, sar, nfe, seconds * 1e3))
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.frame_pack import FramePackCache, pack_path
+
+
+# Fetching the center frames of random videos the way MuddyMixDataset does:
+# listdir + sort + one open/read per frame vs. the .fpk pack (one pread per
+# frame). Run after preprocessing/pack_frames.py; drop the page cache
+# (echo 3 > /proc/sys/vm/drop_caches) between runs to measure cold reads.
+# python benchmarks/bench_frame_pack.py --frame_root /home/prj/data/Muddy_Mix --num_frames 3
+def from_dirs(frame_dir, num_frames):
+    names = sorted(f for f in os.listdir(frame_dir) if f.lower().endswith('.jpg'))
+    start = max(0, len(names) // 2 - num_frames // 2)
+    out = []
+    for name in names[start:start + num_frames]:
+        with open(os.path.join(frame_dir, name), 'rb') as f:
+            out.append(f.read())
+    return out
+
+
+def from_pack(cache, frame_dir, num_frames):
+    names = cache.get(frame_dir).names
+    start = max(0, len(names) // 2 - num_frames // 2)
+    return [cache.read(os.path.join(frame_dir, name)) for name in names[start:start + num_frames]]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frame_root', required=True)
+    parser.add_argument('--num_items', default=1000, type=int)
+    parser.add_argument('--num_frames', default=3, type=int)
+    args = parser.parse_args()
+
+    frame_dirs = []
+    for dirpath, dirnames, _ in os.walk(args.frame_root):
+        frame_dirs += [os.path.join(dirpath, d) for d in dirnames
+                       if os.path.exists(pack_path(os.path.join(dirpath, d)))]
+    random.seed(0)
+    items = [random.choice(frame_dirs) for _ in range(args.num_items)]
+    print('{} packed frame folders, {} items'.format(len(frame_dirs), len(items)))
+
+    tic = time.perf_counter()
+    ref = [from_dirs(d, args.num_frames) for d in items]
+    t_dirs = time.perf_counter() - tic
+
+    cache = FramePackCache()
+    tic = time.perf_counter()
+    out = [from_pack(cache, d, args.num_frames) for d in items]
+    t_pack = time.perf_counter() - tic
+
+    assert out == ref
+    print('dirs  {:10.1f} items/s'.format(len(items) / t_dirs))
+    print('pack  {:10.1f} items/s ({:.1f}x)'.format(len(items) / t_pack, t_dirs / t_pack))
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import torch
+import torchvision
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset.base import BaseDataset
+from modules.networks import Resnet
+
+
+# Load + encode throughput of the resnet18 frame path for several
+# --num_frames, with every frame loaded (--frame_select all) vs. only the
+# frames forward_multiframe consumes (--frame_select consumed). Clips are
+# synthetic 320x240 JPEGs; the embeddings of both settings are compared in
+# eval mode.
+# python benchmarks/bench_frame_select.py --num_frames_list 1 3 5 8 --num_clips 64
+def write_clip(root, num_frames, rng):
+    paths = []
+    for i in range(num_frames):
+        path = os.path.join(root, '{:06d}.jpg'.format(i + 1))
+        Image.fromarray(rng.randint(0, 256, (240, 320, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def run(dataset, net, clips, batch_size, device):
+    embs = []
+    tic = time.perf_counter()
+    with torch.no_grad():
+        for i in range(0, len(clips), batch_size):
+            frames = torch.stack([dataset._load_frames(dataset._consumed(paths))
+                                  for paths in clips[i:i + batch_size]])
+            embs.append(net.forward_multiframe(frames.to(device)))
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return time.perf_counter() - tic, torch.cat(embs)
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--num_frames_list', default=[1, 3, 5, 8], type=int, nargs='+')
+    parser.parser.add_argument('--num_clips', default=64, type=int)
+    args = parser.parser.parse_args()
+    args.arch_frame = 'resnet18'
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    net = Resnet(torchvision.models.resnet18()).to(device).eval()
+    rng = np.random.RandomState(args.seed)
+    with tempfile.TemporaryDirectory() as root:
+        print('{:>10} {:>12} {:>14} {:>8} {:>10}'.format(
+            'num_frames', 'all clip/s', 'consumed clip/s', 'speedup', 'max diff'))
+        for num_frames in args.num_frames_list:
+            clips = []
+            for c in range(args.num_clips):
+                clip_dir = os.path.join(root, str(num_frames), str(c))
+                os.makedirs(clip_dir)
+                clips.append(write_clip(clip_dir, num_frames, rng))
+            args.num_frames = num_frames
+            args.frame_select = 'all'
+            full = BaseDataset([], args, split='val')
+            args.frame_select = 'consumed'
+            consumed = BaseDataset([], args, split='val')
+
+            t_all, ref = run(full, net, clips, args.batch_size_per_gpu, device)
+            t_consumed, out = run(consumed, net, clips, args.batch_size_per_gpu, device)
+            print('{:10d} {:12.1f} {:14.1f} {:7.1f}x {:10.2e}'.format(
+                num_frames, len(clips) / t_all, len(clips) / t_consumed,
+                t_all / t_consumed, (out - ref).abs().max().item()))
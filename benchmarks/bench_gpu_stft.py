@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import numpy as np
+import librosa
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from modules import stft
+from utils import istft_reconstruction
+
+
+# Spectrogram front-end for a batch of num_mix-source mixtures: N+1 librosa
+# STFTs per item (old _mix_n_and_stft in the workers) vs. one batched
+# torch.stft over the sources on args.device, plus the eval ISTFT. Also
+# reports the largest deviation from librosa and checks that the
+# spectrograms agree, first and last (padded) frames included.
+# python benchmarks/bench_gpu_stft.py --batch_size_per_gpu 32 --num_mix 2
+def librosa_front(audios, args):
+    mags, phases = [], []
+    for j in range(audios.shape[1]):
+        mix = audios[:, j].mean(0)
+        spec = librosa.stft(mix, n_fft=args.stft_frame, hop_length=args.stft_hop)
+        phases.append(np.angle(spec))
+        mags.append(np.abs(spec))
+        for n in range(audios.shape[0]):
+            np.abs(librosa.stft(audios[n, j], n_fft=args.stft_frame, hop_length=args.stft_hop))
+    return np.stack(mags), np.stack(phases)
+
+
+def sync(args):
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--repeat', default=5, type=int)
+    args = parser.parser.parse_args()
+    args.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    B, N = args.batch_size_per_gpu, args.num_mix
+
+    rng = np.random.RandomState(args.seed)
+    audios = (rng.rand(N, B, args.audLen).astype(np.float32) - 0.5) * 0.5
+    batch_data = {'audios': [torch.from_numpy(a) for a in audios],
+                  'audio_mix': torch.from_numpy(audios.mean(0))}
+
+    tic = time.perf_counter()
+    for _ in range(args.repeat):
+        mag_ref, phase_ref = librosa_front(audios, args)
+    t_stft_ref = (time.perf_counter() - tic) / args.repeat
+
+    stft.batch_spectrograms(dict(batch_data), args)
+    sync(args)
+    tic = time.perf_counter()
+    for _ in range(args.repeat):
+        out = stft.batch_spectrograms(dict(batch_data), args)
+    sync(args)
+    t_stft = (time.perf_counter() - tic) / args.repeat
+
+    tic = time.perf_counter()
+    wav_ref = np.stack([istft_reconstruction(mag_ref[j], phase_ref[j], hop_length=args.stft_hop)
+                        for j in range(B)])
+    t_istft_ref = time.perf_counter() - tic
+    tic = time.perf_counter()
+    wav = stft.istft(out['mag_mix'][:, 0], out['phase_mix'][:, 0], args.stft_hop).cpu().numpy()
+    sync(args)
+    t_istft = time.perf_counter() - tic
+
+    mag = out['mag_mix'][:, 0].cpu().numpy()
+    print('batch {} x {} sources, spectrogram {}, device {}'.format(
+        B, N, tuple(mag.shape[1:]), args.device))
+    print('{:8} {:>12} {:>12} {:>8}'.format('', 'librosa ms', 'torch ms', 'speedup'))
+    print('{:8} {:12.1f} {:12.1f} {:7.1f}x'.format(
+        'stft', t_stft_ref * 1e3, t_stft * 1e3, t_stft_ref / t_stft))
+    print('{:8} {:12.1f} {:12.1f} {:7.1f}x'.format(
+        'istft', t_istft_ref * 1e3, t_istft * 1e3, t_istft_ref / t_istft))
+    print('max |mag diff| {:.2e}, max |wav diff| {:.2e}'.format(
+        np.abs(mag - mag_ref).max(), np.abs(wav - wav_ref).max()))
+    tol = 1e-4 * np.abs(mag_ref).max()
+    for name, frames in [('first', 0), ('last', -1), ('all', slice(None))]:
+        diff = np.abs(mag[..., frames] - mag_ref[..., frames]).max()
+        assert diff <= tol, '{} frames differ from librosa by {:.2e}'.format(name, diff)
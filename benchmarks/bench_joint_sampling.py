@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from modules import models
+from main import NetWrapper
+
+
+# DDIM inference of main.py: one ddim_sample call and one frame-net pass per
+# source (the old NetWrapper.sample) vs. the N sources stacked along the batch.
+# Both runs get the same noise, so the separated magnitudes should match up
+# to kernel-level float differences. Inputs are random 256x256 spectrograms.
+# python benchmarks/bench_joint_sampling.py --batch_size_per_gpu 8 --num_mix 2
+def per_source(wrapper, batch_data, args, noise):
+    B, N = batch_data['mag_mix'].size(0), args.num_mix
+    log_mag_mix = (torch.log1p(batch_data['mag_mix'] + 1e-10) * wrapper.scale_factor).clamp(0., 1.)
+    pred_mags = []
+    for n in range(N):
+        feat = wrapper.net_frame.forward_multiframe(batch_data['frames'][n].to(args.device), pool=False)
+        preds = wrapper.sampler.ddim_sample(
+            condition=[log_mag_mix, feat], shape=log_mag_mix.shape, silence_mask_sampling=True,
+            noise=noise[:, n * B:(n + 1) * B])
+        pred_mags.append(torch.exp((preds / wrapper.scale_factor).abs()) - 1)
+    return pred_mags
+
+
+def timed(fn, args):
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    out = fn()
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+    return time.perf_counter() - tic, out
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    args = parser.parser.parse_args()
+    args.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    args.log_freq = 0
+    args.gpu_stft = 0
+    B, N = args.batch_size_per_gpu, args.num_mix
+    torch.manual_seed(args.seed)
+
+    builder = models.ModelBuilder()
+    nets = (builder.build_visual(pool_type=args.img_pool, arch_frame=args.arch_frame),
+            builder.build_unet())
+    wrapper = NetWrapper(nets).to(args.device).eval()
+
+    mags = [torch.rand(B, 1, 256, 256, device=args.device) for _ in range(N)]
+    batch_data = {'mag_mix': sum(mags) / N, 'mags': mags,
+                  'frames': [torch.randn(B, 3, args.num_frames, args.imgSize, args.imgSize)
+                             for _ in range(N)]}
+    noise = torch.randn(wrapper.sampler.sampling_timesteps + 1, N * B, 1, 256, 256,
+                        device=args.device)
+
+    with torch.no_grad():
+        t_ref, ref = timed(lambda: per_source(wrapper, dict(batch_data, mags=list(mags)), args, noise), args)
+        t_joint, out = timed(lambda: wrapper.sample(dict(batch_data, mags=list(mags)), args, noise=noise)['pred_mags'], args)
+
+    print('per-source {:.3f}s, stacked {:.3f}s, speedup {:.2f}x'.format(t_ref, t_joint, t_ref / t_joint))
+    for n in range(N):
+        print('source {}: max |diff| {:.3e}'.format(n, (out[n] - ref[n]).abs().max().item()))
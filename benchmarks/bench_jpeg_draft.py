@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import random
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset.base import BaseDataset
+
+
+# Frame decoding over the Muddy_Mix frames/ directories: full-resolution
+# decode vs. --jpeg_draft, through both the val vid_transform and the CLIP
+# preprocessing. Reports decode+transform time and how much the transformed
+# pixels move (in units of the normalized input).
+# python benchmarks/bench_jpeg_draft.py --frame_root /home/prj/data/Muddy_Mix --num_items 500
+def find_frames(root):
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        if os.path.basename(dirpath) == 'frames':
+            paths += [os.path.join(dirpath, f) for f in filenames if f.lower().endswith('.jpg')]
+    return sorted(paths)
+
+
+def run(load, paths):
+    tic = time.perf_counter()
+    outs = [load([path]) for path in paths]
+    return time.perf_counter() - tic, outs
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--frame_root', required=True)
+    parser.parser.add_argument('--num_items', default=500, type=int)
+    args = parser.parser.parse_args()
+
+    paths = find_frames(args.frame_root)
+    random.seed(args.seed)
+    paths = random.sample(paths, min(args.num_items, len(paths)))
+    print('{} frames from {}'.format(len(paths), args.frame_root))
+
+    args.jpeg_draft = 0
+    full = BaseDataset([], args, split='val')
+    args.jpeg_draft = 1
+    draft = BaseDataset([], args, split='val')
+
+    print('{:6} {:>12} {:>12} {:>8} {:>10} {:>10}'.format(
+        'path', 'full ms', 'draft ms', 'speedup', 'mean diff', 'max diff'))
+    for name in ['vid', 'clip']:
+        attr = '_load_frames_clip' if name == 'clip' else '_load_frames'
+        t_full, ref = run(getattr(full, attr), paths)
+        t_draft, out = run(getattr(draft, attr), paths)
+        diffs = [(a - b).abs() for a, b in zip(out, ref)]
+        print('{:6} {:12.2f} {:12.2f} {:7.1f}x {:10.4f} {:10.4f}'.format(
+            name, t_full * 1e3 / len(paths), t_draft * 1e3 / len(paths), t_full / t_draft,
+            np.mean([d.mean().item() for d in diffs]), max(d.max().item() for d in diffs)))
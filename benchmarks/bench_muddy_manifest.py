@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset import MuddyMixDataset
+
+
+# MuddyMixDataset path resolution on the plain valid_muddy_mix_audios csv
+# (listdir + sort + center selection, plus the clip.tokenize call the old
+# __getitem__ made) vs. the manifest from preprocessing/build_muddy_manifest.py.
+# Audio/frame decoding is excluded.
+# python benchmarks/bench_muddy_manifest.py --list_val valid_muddy_mix_audios_val.csv \
+#     --manifest valid_muddy_mix_audios_val_manifest.csv --num_frames 3
+def old_item(dataset, info, tokenize):
+    video_path = os.path.join(dataset.root_dir, info['Video_Name'], 'sub_video', info['SubVideo_Name'])
+    if tokenize is not None:
+        tokenize('an image of human speaking')
+    return dataset._select_frames(info, video_path)
+
+
+def new_item(dataset, info):
+    video_path = os.path.join(dataset.root_dir, info['Video_Name'], 'sub_video', info['SubVideo_Name'])
+    return dataset._select_frames(info, video_path)
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.add_train_arguments()
+    parser.parser.add_argument('--root', default='/home/prj/data/Muddy_Mix')
+    parser.parser.add_argument('--manifest', required=True)
+    args = parser.parser.parse_args()
+    try:
+        from clip import tokenize
+    except ImportError:
+        tokenize = None
+
+    tic = time.perf_counter()
+    plain = MuddyMixDataset(args.root, args.list_val, args, split='val')
+    t_load_plain = time.perf_counter() - tic
+    tic = time.perf_counter()
+    manifest = MuddyMixDataset(args.root, args.manifest, args, split='val')
+    t_load_manifest = time.perf_counter() - tic
+    assert all(row.get('Num_Frames') == str(args.num_frames) for row in manifest.list_sample), \
+        'manifest was built for a different --num_frames'
+
+    tic = time.perf_counter()
+    ref = [old_item(plain, info, tokenize) for info in plain.list_sample]
+    t_plain = time.perf_counter() - tic
+    tic = time.perf_counter()
+    out = [new_item(manifest, info) for info in manifest.list_sample]
+    t_manifest = time.perf_counter() - tic
+
+    ref = {tuple(paths): n for paths, n in ref}
+    mismatch = sum(ref.get(tuple(paths)) != n for paths, n in out)
+    print('{:9} {:>8} {:>10} {:>14}'.format('', 'rows', 'load ms', 'per item us'))
+    print('{:9} {:8d} {:10.1f} {:14.1f}'.format(
+        'plain', len(plain), t_load_plain * 1e3, t_plain * 1e6 / len(plain)))
+    print('{:9} {:8d} {:10.1f} {:14.1f}'.format(
+        'manifest', len(manifest), t_load_manifest * 1e3, t_manifest * 1e6 / len(manifest)))
+    print('tokenize {}, {} selections differ'.format(
+        'included' if tokenize is not None else 'unavailable', mismatch))
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.partners import ClassPartnerSampler
+
+
+# Partner selection for num_mix sources: rejection sampling over the whole
+# list (old __getitem__) vs. ClassPartnerSampler, on a skewed class
+# distribution where a few classes hold most of the items.
+def rejection(labels, first, num_mix):
+    class_list = [labels[first]]
+    for n in range(1, num_mix):
+        indexN = random.randint(0, len(labels) - 1)
+        while labels[indexN] in class_list:
+            indexN = random.randint(0, len(labels) - 1)
+        class_list.append(labels[indexN])
+    return class_list
+
+
+def bucketed(sampler, labels, first, num_mix):
+    class_list = [labels[first]]
+    for n in range(1, num_mix):
+        class_list.append(labels[sampler.sample(class_list)])
+    return class_list
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', default=50000, type=int)
+    parser.add_argument('--classes', default=11, type=int)
+    parser.add_argument('--skew', default=1.5, type=float,
+                        help='zipf exponent of the class sizes')
+    parser.add_argument('--mixtures', default=20000, type=int)
+    args = parser.parse_args()
+
+    weights = [1. / (c + 1) ** args.skew for c in range(args.classes)]
+    labels = random.choices(range(args.classes), weights=weights, k=args.items)
+    firsts = [random.randrange(args.items) for _ in range(args.mixtures)]
+    sampler = ClassPartnerSampler(labels)
+
+    print('{} items, {} classes (largest {:.0%})'.format(
+        args.items, sampler.num_classes, max(sampler.counts) / args.items))
+    print('{:>8} {:>16} {:>16} {:>8}'.format('num_mix', 'rejection mix/s', 'bucketed mix/s', 'speedup'))
+    for num_mix in range(2, min(8, sampler.num_classes) + 1):
+        tic = time.perf_counter()
+        for first in firsts:
+            rejection(labels, first, num_mix)
+        t_rej = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        for first in firsts:
+            bucketed(sampler, labels, first, num_mix)
+        t_bkt = time.perf_counter() - tic
+        print('{:8d} {:16.0f} {:16.0f} {:7.1f}x'.format(
+            num_mix, args.mixtures / t_rej, args.mixtures / t_bkt, t_rej / t_bkt))
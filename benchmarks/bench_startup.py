@@ -0,0 +1,54 @@
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Startup time and RSS of a fresh interpreter importing main_fm_muddy (the
+# training process) and dataset (what every spawned DataLoader worker
+# imports). --legacy additionally runs clip.load("ViT-B/32") the way
+# dataset/base.py used to at import time.
+CHILD = '''
+import time
+tic = time.perf_counter()
+import {module}
+if {legacy}:
+    import clip
+    clip.load("ViT-B/32", device="cpu")
+elapsed = time.perf_counter() - tic
+rss = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1]) / 1024.
+print(elapsed, rss)
+'''
+
+
+def measure(module, legacy, repeat):
+    times, rsss = [], []
+    for _ in range(repeat):
+        out = subprocess.check_output(
+            [sys.executable, '-c', CHILD.format(module=module, legacy=legacy)], cwd=ROOT)
+        elapsed, rss = map(float, out.decode().split()[-2:])
+        times.append(elapsed)
+        rsss.append(rss)
+    return min(times), max(rsss)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', default=3, type=int)
+    parser.add_argument('--workers', default=16, type=int,
+                        help='number of DataLoader workers to extrapolate RSS to')
+    args = parser.parse_args()
+
+    print('{:14} {:8} {:>10} {:>10} {:>14}'.format(
+        'module', 'mode', 'import s', 'RSS MB', 'x{} workers MB'.format(args.workers)))
+    for module in ['main_fm_muddy', 'dataset']:
+        for legacy in [True, False]:
+            elapsed, rss = measure(module, legacy, args.repeat)
+            print('{:14} {:8} {:10.2f} {:10.1f} {:14.1f}'.format(
+                module, 'clip.load' if legacy else 'lazy', elapsed, rss,
+                rss * args.workers if module == 'dataset' else float('nan')))
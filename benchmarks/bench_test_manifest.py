@@ -0,0 +1,68 @@
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.base import build_csv_index
+
+
+# Test-split info lookup: per-item csv parse + linear scan (old
+# MUSICMixDataset/AVEMixDataset test branch) vs. the prebuilt cell index.
+def scan_lookup(csv_path, samples):
+    csv_lis = []
+    for row in csv.reader(open(csv_path, 'r'), delimiter=','):
+        if len(row) < 2:
+            continue
+        csv_lis.append(row)
+    infos = []
+    for sample in samples:
+        info = []
+        for data in csv_lis:
+            if sample in data:
+                info = data
+                break
+        infos.append(info)
+    return infos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', default=5000, type=int)
+    parser.add_argument('--items', default=200, type=int)
+    parser.add_argument('--num_mix', default=2, type=int)
+    parser.add_argument('--manifest', default='',
+                        help='real test.csv to use instead of a synthetic one')
+    args = parser.parse_args()
+
+    csv_path = args.manifest
+    if not csv_path:
+        fd, csv_path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as f:
+            writer = csv.writer(f)
+            for i in range(args.rows):
+                writer.writerow(['audio/cls{}/{:06d}.wav'.format(i % 11, i),
+                                 'frames/cls{}/{:06d}.mp4'.format(i % 11, i), 200])
+    rows = [row for row in csv.reader(open(csv_path)) if len(row) >= 2]
+    items = [[random.choice(rows)[0] for _ in range(args.num_mix)] for _ in range(args.items)]
+
+    tic = time.perf_counter()
+    scanned = [scan_lookup(csv_path, samples) for samples in items]
+    t_scan = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    index = build_csv_index(csv_path)
+    t_build = time.perf_counter() - tic
+    tic = time.perf_counter()
+    indexed = [[index.get(s, []) for s in samples] for samples in items]
+    t_index = time.perf_counter() - tic
+
+    assert scanned == indexed
+    print('{} rows, {} items x {} sources'.format(len(rows), args.items, args.num_mix))
+    print('scan   {:10.1f} items/s'.format(args.items / t_scan))
+    print('index  {:10.1f} items/s (built once in {:.3f}s)'.format(args.items / t_index, t_build))
+    if not args.manifest:
+        os.remove(csv_path)
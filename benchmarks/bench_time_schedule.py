@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from modules import models
+from diffusion_utils import flow_solvers
+
+
+# Per-step latency of the sampling Unet with the time conditioning computed
+# on every call vs. looked up from Unet.compile_schedule, over a fixed-step
+# flow-matching schedule (--fm_solver/--nfe_steps). Also reports the largest
+# output difference between the two.
+# python benchmarks/bench_time_schedule.py --batch_size_per_gpu 8 --fm_solver rk4 --nfe_steps 4
+def run(net, x, times, condition, args):
+    outs = []
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    for _ in range(args.repeat):
+        outs = [net(x, torch.full((x.shape[0],), t, device=x.device) * 1000, condition) for t in times]
+    if args.device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.perf_counter() - tic) / (args.repeat * len(times)), outs
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--repeat', default=5, type=int)
+    args = parser.parser.parse_args()
+    args.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    torch.manual_seed(args.seed)
+    B = args.batch_size_per_gpu
+
+    net = models.ModelBuilder().build_unet().to(args.device).eval()
+    mix = torch.rand(B, 1, 256, 256, device=args.device)
+    condition = [mix, torch.randn(B, 512, 1, device=args.device), mix]
+    x = torch.randn(B, 1, 256, 256, device=args.device)
+    times = flow_solvers.stage_times(args.fm_solver, 0., 1., args.nfe_steps)
+
+    with torch.no_grad():
+        run(net, x, times[:1], condition, args)
+        t_ref, ref = run(net, x, times, condition, args)
+        tic = time.perf_counter()
+        net.net_unet.compile_schedule(torch.tensor(times) * 1000)
+        t_compile = time.perf_counter() - tic
+        t_cached, out = run(net, x, times, condition, args)
+
+    print('{} steps of {}: compile {:.2f} ms'.format(len(times), args.fm_solver, t_compile * 1e3))
+    print('per step: computed {:.2f} ms, cached {:.2f} ms, speedup {:.2f}x'.format(
+        t_ref * 1e3, t_cached * 1e3, t_ref / t_cached))
+    print('max |diff| {:.3e}'.format(max((a - b).abs().max().item() for a, b in zip(out, ref))))
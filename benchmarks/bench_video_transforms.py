@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import random
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset.base import BaseDataset, clip_preprocess
+
+
+# Frame transforms at --imgSize: per-frame PIL vid_transform / clip
+# preprocessing vs. TensorVideoTransform on a stacked uint8 clip and on a
+# whole batch of clips. Decoding is excluded; the max abs difference to the
+# PIL output is reported with the same random crop/flip.
+# python benchmarks/bench_video_transforms.py --imgSize 224 --num_frames 3
+def pil_frames(clip):
+    return [Image.fromarray(frame) for frame in clip]
+
+
+def timed(fn, clips, repeat):
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        for clip in clips:
+            out = fn(clip)
+    return time.perf_counter() - tic, out
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--num_clips', default=32, type=int)
+    parser.parser.add_argument('--height', default=256, type=int)
+    parser.parser.add_argument('--width', default=340, type=int)
+    parser.parser.add_argument('--repeat', default=3, type=int)
+    args = parser.parser.parse_args()
+    torch.set_num_threads(1)  # one DataLoader worker
+
+    rng = np.random.RandomState(args.seed)
+    clips = [rng.randint(0, 256, (args.num_frames, args.height, args.width, 3), dtype=np.uint8)
+             for _ in range(args.num_clips)]
+    batch = np.stack(clips)
+    n_frames = args.num_clips * args.num_frames * args.repeat
+
+    print('{} clips x {} frames of {}x{} -> {}'.format(
+        args.num_clips, args.num_frames, args.height, args.width, args.imgSize))
+    print('{:6} {:>14} {:>14} {:>14} {:>10}'.format(
+        'split', 'PIL frames/s', 'clip frames/s', 'batch frames/s', 'max diff'))
+    for split in ['train', 'val', 'clip']:
+        dataset = BaseDataset([], args, split='val' if split == 'clip' else split)
+        if split == 'clip':
+            preprocess = clip_preprocess()
+            pil_fn = lambda clip: torch.stack([preprocess(f) for f in pil_frames(clip)], dim=1)
+            tensor_fn = dataset.clip_tensor_transform
+        else:
+            pil_fn = lambda clip: dataset.vid_transform(pil_frames(clip))
+            tensor_fn = dataset.vid_tensor_transform
+
+        random.seed(args.seed)
+        t_pil, _ = timed(pil_fn, clips, args.repeat)
+        t_clip, _ = timed(tensor_fn, clips, args.repeat)
+        tic = time.perf_counter()
+        for _ in range(args.repeat):
+            tensor_fn(batch)
+        t_batch = time.perf_counter() - tic
+
+        diff = 0.
+        for i, clip in enumerate(clips):
+            random.seed(i)
+            ref = pil_fn(clip)
+            random.seed(i)
+            diff = max(diff, (tensor_fn(clip) - ref).abs().max().item())
+        print('{:6} {:14.1f} {:14.1f} {:14.1f} {:10.4f}'.format(
+            split, n_frames / t_pil, n_frames / t_clip, n_frames / t_batch, diff))
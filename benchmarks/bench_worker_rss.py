@@ -0,0 +1,84 @@
+import os
+import sys
+import random
+import argparse
+import torch
+import torch.utils.data as torchdata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.sample_list import SampleList, VirtualEpochSampler
+
+
+# Memory watermark of forked DataLoader workers over one epoch: the old
+# list_sample (list of DictReader dicts, duplicated dup_trainset times and
+# shuffled by the DataLoader) vs. SampleList + VirtualEpochSampler. Each item
+# reports its worker's RSS and private dirty memory; pages copied on write
+# because of refcount updates show up as growth of the private part.
+# python benchmarks/bench_worker_rss.py --rows 20000 --dup 40 --workers 16
+def memory_kb():
+    rss = private = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Rss:'):
+                rss = int(line.split()[1])
+            elif line.startswith('Private_Dirty:'):
+                private = int(line.split()[1])
+    return rss, private
+
+
+class RowsDataset(torchdata.Dataset):
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        row = self.rows[index]
+        return torch.tensor(memory_kb() + (len(row),))
+
+
+def make_rows(n):
+    fields = ['Video_Name', 'SubVideo_Name', 'Speech_Path', 'Raw_Audio_Path',
+              'Speech_Duration_Sec', 'Raw_Duration_Sec', 'Speech_Max_Amplitude',
+              'Raw_Max_Amplitude', 'Amplitude_Ratio', 'Speech_Size_MB', 'Raw_Size_MB']
+    return [{f: '/home/prj/data/Muddy_Mix/{:08d}/{}/{:.4f}'.format(i, f, random.random())
+             for f in fields} for i in range(n)]
+
+
+def run(dataset, sampler, args):
+    loader = torchdata.DataLoader(dataset, batch_size=args.batch_size, sampler=sampler,
+                                  num_workers=args.workers)
+    marks = []
+    total = len(loader)
+    for i, batch in enumerate(loader):
+        if i % max(1, total // 10) == 0 or i == total - 1:
+            marks.append((i / float(total), batch[:, 0].max().item() / 1024.,
+                          batch[:, 1].max().item() / 1024.))
+    return marks
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', default=20000, type=int)
+    parser.add_argument('--dup', default=40, type=int)
+    parser.add_argument('--workers', default=16, type=int)
+    parser.add_argument('--batch_size', default=64, type=int)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+
+    old = RowsDataset(rows * args.dup)
+    old_sampler = torchdata.RandomSampler(old)
+    new = RowsDataset(SampleList(rows))
+    new_sampler = VirtualEpochSampler(args.rows, args.dup)
+    del rows
+
+    results = [('list x dup', run(old, old_sampler, args)),
+               ('SampleList', run(new, new_sampler, args))]
+    print('max worker RSS / private dirty MB over one epoch of {} items'.format(args.rows * args.dup))
+    print('{:>8} '.format('epoch') + ' '.join('{:>24}'.format(name) for name, _ in results))
+    for k in range(len(results[0][1])):
+        line = '{:8.0%} '.format(results[0][1][k][0])
+        for _, marks in results:
+            line += ' {:11.1f} / {:10.1f}'.format(*marks[k][1:])
+        print(line)
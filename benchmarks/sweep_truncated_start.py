@@ -0,0 +1,69 @@
+import os
+import sys
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset import MuddyMixDataset
+from dataset.materialized import MaterializedDataset
+from modules import models
+from main_fm_muddy import NetWrapper, calc_metrics, error_avoidance_collate
+
+
+# Truncated-start sweep of the flow-matching sampler on the Muddy_Mix
+# validation loader: SDR/SIR/SAR and network evaluations (NFE) per clip for
+# every --sample_t_start in --t_starts and every step count in --steps,
+# with the solver of --fm_solver. t_start 0 is the usual start from noise.
+# python benchmarks/sweep_truncated_start.py --weights_unet ckpt/unet_best.pth --weights_frame ckpt/frame_best.pth \
+#     --list_val valid_muddy_mix_audios_val.csv --t_starts 0 0.3 0.5 0.7 --steps 1 2 4 --num_batches 50
+def run(wrapper, loader, args):
+    torch.manual_seed(args.seed)
+    metrics, nfe, clips = [], 0, 0
+    for i, batch_data in enumerate(loader):
+        if i >= args.num_batches:
+            break
+        if batch_data is None:
+            continue
+        outputs = wrapper.sample(batch_data, args)
+        metrics.append(calc_metrics(batch_data, outputs, args))
+        nfe += outputs['nfe'] * batch_data['audio_mix'].size(0)
+        clips += batch_data['audio_mix'].size(0)
+    return np.nanmean(metrics, axis=0), nfe / clips
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.add_train_arguments()
+    parser.parser.add_argument('--data_root', default='/home/prj/data/Muddy_Mix')
+    parser.parser.add_argument('--t_starts', default=[0., 0.3, 0.5, 0.7], type=float, nargs='+')
+    parser.parser.add_argument('--steps', default=[1, 2, 4], type=int, nargs='+')
+    parser.parser.add_argument('--num_batches', default=50, type=int)
+    args = parser.parser.parse_args()
+    args.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    args.batch_size = args.batch_size_per_gpu
+
+    builder = models.ModelBuilder()
+    nets = (builder.build_visual(pool_type=args.img_pool, weights=args.weights_frame,
+                                 arch_frame=args.arch_frame),
+            builder.build_unet(weights=args.weights_unet))
+    wrapper = NetWrapper(nets).to(args.device).eval()
+
+    if args.eval_store:
+        dataset_val = MaterializedDataset(args.eval_store, args, max_sample=args.num_val)
+    else:
+        dataset_val = MuddyMixDataset(args.data_root, args.list_val, args,
+                                      max_sample=args.num_val, split='val')
+    loader = torch.utils.data.DataLoader(
+        dataset_val, batch_size=args.batch_size, shuffle=False,
+        num_workers=int(args.workers), collate_fn=error_avoidance_collate)
+
+    print('{:>8} {:>6} {:>10} {:>8} {:>8} {:>8} {:>8}'.format(
+        't_start', 'steps', 'NFE/clip', 'SDR mix', 'SDR', 'SIR', 'SAR'))
+    with torch.no_grad():
+        for t_start in args.t_starts:
+            for steps in args.steps:
+                args.sample_t_start, args.nfe_steps = t_start, steps
+                (sdr_mix, sdr, sir, sar), nfe = run(wrapper, loader, args)
+                print('{:8.2f} {:6d} {:10.1f} {:8.2f} {:8.2f} {:8.2f} {:8.2f}'.format(
+                    t_start, steps, nfe, sdr_mix, sdr, sir, sar))
@@ -0,0 +1,111 @@
+import os
+import json
+import numpy as np
+
+
+class ArrayStore(object):
+    """Read-only store of arrays concatenated along axis 0 in one flat file.
+
+    `<prefix>.bin` holds the raw rows, `<prefix>.json` the dtype, the shape of
+    one row, free-form metadata and a `key -> [offset, length(, names)]`
+    index, where the optional names ('|'-joined) label the rows. The
+    memmap is opened lazily so that the store can be handed to DataLoader
+    workers (fork or spawn) without pickling or copying the data.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        with open(prefix + '.json', 'r') as f:
+            header = json.load(f)
+        self.dtype = np.dtype(header['dtype'])
+        self.shape = tuple(header['shape'])
+        self.meta = header.get('meta', {})
+        self.index = header['index']
+        self._data = None
+        self._rows = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_data'] = None
+        state['_rows'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        return self.index.keys()
+
+    @property
+    def data(self):
+        if self._data is None:
+            row_items = int(np.prod(self.shape))
+            rows = os.path.getsize(self.prefix + '.bin') // (self.dtype.itemsize * row_items)
+            self._data = np.memmap(self.prefix + '.bin', dtype=self.dtype,
+                                   mode='r', shape=(rows,) + self.shape)
+        return self._data
+
+    def __getitem__(self, key):
+        # a view into the memmap, nothing is read until it is sliced/copied
+        offset, length = self.index[key][:2]
+        return self.data[offset:offset + length]
+
+    def names(self, key):
+        return self.index[key][2].split('|')
+
+    def row(self, key, name):
+        # row of `key` labelled `name`, the name -> row maps are rebuilt on demand
+        if key not in self._rows:
+            if len(self._rows) > 4096:
+                self._rows.clear()
+            self._rows[key] = {n: i for i, n in enumerate(self.names(key))}
+        offset = self.index[key][0]
+        return self.data[offset + self._rows[key][name]]
+
+
+class ArrayStoreWriter(object):
+    """Appends arrays to a new ArrayStore, see ArrayStore for the layout."""
+
+    def __init__(self, prefix, dtype, shape=(), meta=None):
+        self.prefix = prefix
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.meta = meta or {}
+        self.index = {}
+        self.offset = 0
+        dirname = os.path.dirname(prefix)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.f = open(prefix + '.bin.tmp', 'wb')
+
+    def add(self, key, array, names=None):
+        array = np.ascontiguousarray(array, dtype=self.dtype)
+        assert array.shape[1:] == self.shape, \
+            'row shape {} does not match store shape {}'.format(array.shape[1:], self.shape)
+        self.f.write(array.tobytes())
+        self.index[key] = [self.offset, array.shape[0]]
+        if names is not None:
+            assert len(names) == array.shape[0]
+            self.index[key].append('|'.join(names))
+        self.offset += array.shape[0]
+
+    def close(self):
+        self.f.close()
+        header = {'dtype': self.dtype.str, 'shape': list(self.shape),
+                  'meta': self.meta, 'index': self.index}
+        with open(self.prefix + '.json.tmp', 'w') as f:
+            json.dump(header, f)
+        os.replace(self.prefix + '.bin.tmp', self.prefix + '.bin')
+        os.replace(self.prefix + '.json.tmp', self.prefix + '.json')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.f.close()
@@ -1,12 +1,16 @@
 import os
 import random
 import numpy as np
+import torch
 import csv
-from .base import BaseDataset
+from .base import BaseDataset, build_csv_index
+from .partners import ClassPartnerSampler
 import clip
 
 
 class AVEMixDataset(BaseDataset):
+    test_manifest = "../data/AVE/test.csv"
+
     def __init__(self, list_sample, opt, **kwargs): # opt : args
         super(AVEMixDataset, self).__init__(
             list_sample, opt, **kwargs)
@@ -15,8 +19,24 @@ class AVEMixDataset(BaseDataset):
         self.audLen = opt.audLen
         self.model_type = opt.arch_frame
 
+        # parsed once here so that forked workers share it
+        self.test_index = None
+        self.partner_sampler = None
+        if self.split not in ('train', 'val'):
+            self.test_index = build_csv_index(self.test_manifest)
+        else:
+            self.partner_sampler = ClassPartnerSampler(
+                self._sample_class(sample) for sample in self.list_sample)
+            if self.partner_sampler.num_classes < self.num_mix:
+                raise ValueError('cannot mix {} sources from {} classes'.format(
+                    self.num_mix, self.partner_sampler.num_classes))
+
+    def _sample_class(self, sample):
+        return sample[-1]
+
     def __getitem__(self, index):
-        N = self.num_mix
+        # solo clips with --batch_mix, mixed by BatchMixCollate
+        N = 1 if self.batch_mix else self.num_mix
         frames = [None for n in range(N)]
         audios = [None for n in range(N)]
         infos = [[] for n in range(N)]
@@ -25,54 +45,32 @@ class AVEMixDataset(BaseDataset):
         path_frames_det = ['' for n in range(N)]
         path_audios = ['' for n in range(N)]
         center_frames = [0 for n in range(N)]
+        windows = [None for n in range(N)]
         class_list = []
 
-        if self.split == 'train':
+        if self.split in ('train', 'val'):
             # the first video
             infos[0] = self.list_sample[index]
-            cls = infos[0][-1]
-            class_list.append(cls)
-            for n in range(1, N):
-                indexN = random.randint(0, len(self.list_sample)-1)
-                sample = self.list_sample[indexN]
-                while sample[-1] in class_list:
-                    indexN = random.randint(0, len(self.list_sample) - 1)
-                    sample = self.list_sample[indexN]
-                infos[n] = sample
-                class_list.append(sample[-1])
-        elif self.split == 'val':
-            infos[0] = self.list_sample[index]
-            cls = infos[0][-1]
-            class_list.append(cls)
-            if not self.split == 'train':
-                random.seed(index)
-
+            class_list.append(self._sample_class(infos[0]))
+            # val mixtures are fixed by the seed and the index
+            rng = random if self.split == 'train' else random.Random(self.seed + index)
             for n in range(1, N):
-                indexN = random.randint(0, len(self.list_sample) - 1)
-                sample = self.list_sample[indexN]
-                while sample[-1] in class_list:
-                    indexN = random.randint(0, len(self.list_sample) - 1)
-                    sample = self.list_sample[indexN]
+                sample = self.list_sample[self.partner_sampler.sample(class_list, rng)]
+                # redraw quarantined train partners; val keeps its fixed
+                # mixture and falls back to dummy data if a partner fails
+                for _ in range(10 if self.split == 'train' else 0):
+                    if not self._is_quarantined(sample):
+                        break
+                    sample = self.list_sample[self.partner_sampler.sample(class_list, rng)]
                 infos[n] = sample
-                class_list.append(sample[-1])
+                class_list.append(self._sample_class(sample))
         else:
-            csv_lis_path = "../data/AVE/test.csv"
-            csv_lis = []
-            for row in csv.reader(open(csv_lis_path, 'r'), delimiter=','):
-                if len(row) < 2:
-                    continue
-                csv_lis.append(row)
             random.seed(index) # fixed
             samples = self.list_sample[index]
             for n in range(N):
                 sample = samples[n].replace(" ", "")
                 sample = sample.split('/')[2]
-
-                for i in range(len(csv_lis)):
-                    data = csv_lis[i]
-                    if sample in data: 
-                        infos[n] = data
-                        break
+                infos[n] = self.test_index.get(sample, [])
 
         FPS = [None for n in range(N)]
         classes = [None for n in range(N)]
@@ -102,34 +100,53 @@ class AVEMixDataset(BaseDataset):
             path_audios[n] = os.path.join("/YOUR_ROOT/AVE_Dataset/audio", path_audioN)
 
         # load frames and audios, STFT
+        failed = None
         try:
             for n, infoN in enumerate(infos):
+                failed = infoN
                 if self.model_type != 'clip':
-                    frames[n] = self._load_frames(path_frames[n])
+                    frames[n] = self._load_frames(self._consumed(path_frames[n]))
                 else:
-                    frames[n] = self._load_frames_clip(path_frames[n])
+                    frames[n] = self._load_frames_clip(self._consumed(path_frames[n]))
                     
                 # jitter audio
                 center_timeN = 5
                 audios[n] = self._load_audio(path_audios[n], center_timeN)
-            mag_mix, mags, phase_mix, audio_mix = self._mix_n_and_stft(audios)
+                windows[n] = (path_audios[n], center_timeN)
+            failed = None
+            if self.batch_mix:
+                audios = [torch.from_numpy(audio) for audio in audios]
+            elif self.gpu_stft:
+                audio_mix = self._mix_n(audios)
+                audios = [torch.from_numpy(audio) for audio in audios]
+            else:
+                mag_mix, mags, phase_mix, audio_mix = self._mix_n_and_stft(audios, windows)
 
         except Exception as e:
             print('Failed loading frame/audio: {}'.format(e))
+            if failed is not None:
+                self._quarantine_sample(failed, e)
             # create dummy data
             mag_mix, mags, frames, audios, phase_mix = \
                 self.dummy_mix_data(N)
             audio_mix = audios[0]
 
-        ret_dict = {'mag_mix': mag_mix, 'frames': frames, 'mags': mags, 
-        'audio_mix': audio_mix}
+        if self.batch_mix:
+            return {'frames': frames[0], 'audio': audios[0],
+                    'class': classes[0], 'text': texts[0]}
+
+        ret_dict = {'frames': frames, 'audio_mix': audio_mix}
+        if not self.gpu_stft:
+            ret_dict['mag_mix'] = mag_mix
+            ret_dict['mags'] = mags
         ret_dict['audios'] = audios
         ret_dict['class'] = classes
         ret_dict['text'] = texts
 
         if self.split != 'train':
             # ret_dict['audios'] = audios
-            ret_dict['phase_mix'] = phase_mix
+            if not self.gpu_stft:
+                ret_dict['phase_mix'] = phase_mix
             ret_dict['infos'] = infos
 
         return ret_dict
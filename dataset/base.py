@@ -1,6 +1,9 @@
 import random
 import os
+import io
 import csv
+import math
+from functools import lru_cache
 import numpy as np
 import torch
 import torch.utils.data as torchdata
@@ -10,10 +13,70 @@ from torchvision.transforms import InterpolationMode
 import librosa
 from PIL import Image
 import soundfile as sf
-import clip
 from . import video_transforms as vtransforms
+from .array_store import ArrayStore
+from .stft_cache import STFTCache
+from .frame_pack import FramePackCache
+from .sample_list import SampleList
+from .quarantine import Quarantine
+from modules.networks import consumed_frames
+
+# CLIP ViT-B/32 image preprocessing, same as clip.load("ViT-B/32")[1]
+CLIP_IMG_SIZE = 224
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+# output samples of context kept on each side of a seeked audio window, well
+# beyond the half-width of librosa's default kaiser_best resampling filter
+SEEK_PAD = 256
+
+
+# errors of a broken or unreadable sample: missing/corrupt files
+# (OSError, PIL.UnidentifiedImageError), libsndfile/decoder failures
+# (RuntimeError, soundfile.LibsndfileError) and bad contents (ValueError)
+LOAD_ERRORS = (OSError, RuntimeError, ValueError, EOFError)
+
+
+def _convert_image_to_rgb(image):
+    return image.convert("RGB")
+
+
+@lru_cache(maxsize=None)
+def clip_preprocess():
+    # built on first use and without loading the CLIP weights, so importing
+    # the dataset stays cheap in the main process and in every worker
+    return transforms.Compose([
+        transforms.Resize(CLIP_IMG_SIZE, interpolation=InterpolationMode.BICUBIC),
+        transforms.CenterCrop(CLIP_IMG_SIZE),
+        _convert_image_to_rgb,
+        transforms.ToTensor(),
+        transforms.Normalize(CLIP_MEAN, CLIP_STD),
+    ])
+
+
+def best_box(det_res, id):
+    """Highest-scoring box (x1, y1, x2, y2) of frame `id`, or None.
+
+    det_res rows are (frame id, _, score, x1, y1, x2, y2).
+    """
+    idx = np.where(det_res[:, 0] == id)
+    if len(idx[0])!=0:
+        n = np.argmax(det_res[idx, 2], axis=1)
+        return det_res[idx[0][n[0]], 3:]
+    return None
+
+
+def build_csv_index(path):
+    # maps every cell of the csv to the first row containing it, i.e. the row
+    # a `for row in rows: if sample in row` scan would stop at
+    index = {}
+    for row in csv.reader(open(path, 'r'), delimiter=','):
+        if len(row) < 2:
+            continue
+        for cell in row:
+            index.setdefault(cell, row)
+    return index
 
-_, preprocess = clip.load("ViT-B/32", device="cpu")
 
 class BaseDataset(torchdata.Dataset):
     def __init__(self, list_sample, opt, max_sample=-1, split='train'):
@@ -22,6 +85,17 @@ class BaseDataset(torchdata.Dataset):
         self.stride_frames = opt.stride_frames
         self.frameRate = opt.frameRate
         self.imgSize = opt.imgSize
+        # vectorized frame transforms over the whole clip
+        self.tensor_transform = opt.tensor_transform
+        # reduced-size JPEG decoding, see _open_frame
+        self.jpeg_draft = opt.jpeg_draft
+        # per-video JPEG packs, see preprocessing/pack_frames.py
+        self.frame_pack = FramePackCache() if opt.frame_pack else None
+        # with --frame_select consumed, only the frames the frame net uses
+        # (modules.networks.consumed_frames) are loaded
+        self.frame_slice = slice(None)
+        if opt.frame_select == 'consumed':
+            self.frame_slice = consumed_frames(opt.arch_frame)
         self.audRate = opt.audRate
         self.audLen = opt.audLen
         self.audSec = 1. * self.audLen / self.audRate
@@ -32,11 +106,53 @@ class BaseDataset(torchdata.Dataset):
         self.stft_hop = opt.stft_hop
         self.HS = opt.stft_frame // 2 + 1
         self.WS = (self.audLen + 1) // self.stft_hop
+        # return waveforms only, spectrograms are computed batched on the
+        # training device (modules/stft.py)
+        self.gpu_stft = opt.gpu_stft
+        # MUSIC/AVE train items are solo clips mixed inside the batch
+        # (dataset/batch_mix.py); a train argument, absent for other scripts
+        self.batch_mix = bool(getattr(opt, 'batch_mix', 0)) and split == 'train'
+
+        # optional pre-resampled audio, see preprocessing/build_audio_store.py
+        self.audio_store = None
+        if opt.audio_store:
+            self.audio_store = ArrayStore(opt.audio_store)
+            if self.audio_store.meta.get('rate') != self.audRate:
+                raise ValueError('audio store {} was built at {} Hz, expected {} Hz'.format(
+                    opt.audio_store, self.audio_store.meta.get('rate'), self.audRate))
+        # decode only the cropped audio window, see _seek_audio
+        self.audio_seek = opt.audio_seek
+
+        # detection-cropped frames, see _load_frames_det
+        self.frames_det = opt.frames_det
+        self.det_index = ArrayStore(opt.det_index) if opt.det_index else None
+
+        # optional frozen-backbone frame embeddings, see
+        # preprocessing/extract_frame_features.py
+        self.frame_features = None
+        if opt.frame_features:
+            self.frame_features = ArrayStore(opt.frame_features)
+            if self.frame_features.meta.get('arch') != opt.arch_frame:
+                raise ValueError('frame features {} were extracted with {}, expected {}'.format(
+                    opt.frame_features, self.frame_features.meta.get('arch'), opt.arch_frame))
+
+        # samples that failed to load, skipped from then on
+        quarantine = getattr(opt, 'quarantine', '')
+        self.quarantine = Quarantine(quarantine) if quarantine else None
 
         self.split = split
         self.seed = opt.seed
         random.seed(self.seed)
 
+        # STFT cache, only for the deterministic val/test windows
+        self.stft_cache = None
+        if opt.stft_cache and self.split != 'train':
+            self.stft_cache = STFTCache(opt.stft_cache, {
+                'stft_frame': self.stft_frame, 'stft_hop': self.stft_hop,
+                'audLen': self.audLen, 'audRate': self.audRate,
+                'audio_store': opt.audio_store, 'audio_seek': opt.audio_seek},
+                phase_dtype=opt.stft_cache_phase, prune=opt.stft_cache_prune)
+
         # initialize video transform
         self._init_vtransform()
 
@@ -53,12 +169,11 @@ class BaseDataset(torchdata.Dataset):
         else:
             raise('Error list_sample!')
 
-        if self.split == 'train':
-            self.list_sample *= opt.dup_trainset
-            random.shuffle(self.list_sample)
+        # train duplication and shuffling are done by VirtualEpochSampler
 
         if max_sample > 0:
             self.list_sample = self.list_sample[0:max_sample]
+        self.list_sample = SampleList(self.list_sample)
 
         self.time_index = {}
         
@@ -82,6 +197,26 @@ class BaseDataset(torchdata.Dataset):
     def __len__(self):
         return len(self.list_sample)
 
+    def _is_quarantined(self, sample):
+        return self.quarantine is not None and SampleList.encode(sample) in self.quarantine
+
+    def _quarantine_sample(self, sample, error):
+        # only decode/I/O failures are recorded, anything else is not the
+        # sample's fault; returns whether the sample was quarantined
+        if self.quarantine is None or not isinstance(error, LOAD_ERRORS):
+            return False
+        self.quarantine.add(SampleList.encode(sample), error)
+        return True
+
+    def quarantined_indices(self):
+        # called by VirtualEpochSampler in the main process at every epoch
+        if self.quarantine is None:
+            return []
+        keys = self.quarantine.refresh()
+        if not keys:
+            return []
+        return [i for i in range(len(self.list_sample)) if self.list_sample.raw(i) in keys]
+
     # video transform funcs
     def _init_vtransform(self):
         transform_list = []
@@ -102,6 +237,16 @@ class BaseDataset(torchdata.Dataset):
         self.vid_transform = transforms.Compose(transform_list)
         self.clip_transform = transforms.Compose([vtransforms.Stack()])
 
+        # same pipelines on a stacked uint8 clip, see --tensor_transform
+        if self.split == 'train':
+            self.vid_tensor_transform = vtransforms.TensorVideoTransform(
+                int(self.imgSize * 1.1), self.imgSize, mean, std, train=True)
+        else:
+            self.vid_tensor_transform = vtransforms.TensorVideoTransform(
+                self.imgSize, self.imgSize, mean, std)
+        self.clip_tensor_transform = vtransforms.TensorVideoTransform(
+            CLIP_IMG_SIZE, CLIP_IMG_SIZE, CLIP_MEAN, CLIP_STD)
+
     # image transform funcs, deprecated
     def _init_transform(self):
         mean = [0.485, 0.456, 0.406]
@@ -121,7 +266,27 @@ class BaseDataset(torchdata.Dataset):
                 transforms.ToTensor(),
                 transforms.Normalize(mean, std)])
 
+    def _consumed(self, frames):
+        # paths (or ids) of the frames that are actually encoded
+        return frames[self.frame_slice]
+
+    def _load_features(self, paths):
+        # (T, D) precomputed backbone outputs instead of (C, T, H, W) pixels
+        feats = []
+        for path in paths:
+            frame_dir, name = os.path.split(path)
+            feats.append(self.frame_features.row(os.path.normpath(frame_dir), name))
+        return torch.from_numpy(np.stack(feats).astype(np.float32))
+
+    def _load_clip_uint8(self, paths):
+        # (T, H, W, C) uint8, for the tensor transforms
+        return np.stack([np.asarray(self._load_frame(path)) for path in paths])
+
     def _load_frames(self, paths):
+        if self.frame_features is not None:
+            return self._load_features(paths)
+        if self.tensor_transform:
+            return self.vid_tensor_transform(self._load_clip_uint8(paths))
         frames = []
         for path in paths:
             frames.append(self._load_frame(path))
@@ -129,47 +294,82 @@ class BaseDataset(torchdata.Dataset):
         return frames
 
     def _load_frames_clip(self, paths):
+        if self.frame_features is not None:
+            return self._load_features(paths)
+        if self.tensor_transform:
+            return self.clip_tensor_transform(self._load_clip_uint8(paths))
+        preprocess = clip_preprocess()
         frames = []
         for path in paths:
-            frames.append(preprocess(Image.open(path)))
+            frames.append(preprocess(self._open_frame(path, int(CLIP_IMG_SIZE * 1.1))))
         frames = self.clip_transform(frames)
         return frames
 
     def _load_frames_det(self, paths, path_frames_ids,  path_frames_det):
-        det_res = np.load(path_frames_det)
+        if self.det_index is not None:
+            # dense frame id -> best box table, see preprocessing/build_det_index.py
+            key = os.path.normpath(path_frames_det)
+            table = self.det_index[key] if key in self.det_index else ()
+            boxes = [table[id] if 0 <= id < len(table) else None for id in path_frames_ids]
+        else:
+            det_res = np.load(path_frames_det)
+            boxes = [best_box(det_res, id) for id in path_frames_ids]
         frames = []
         N = len(paths)
         for n in range(N):
-            path = paths[n]
-            id = path_frames_ids[n]
-            frames.append(self._load_frame_det(path, id, det_res))
+            frames.append(self._load_frame_det(paths[n], boxes[n]))
         frames = self.vid_transform(frames)
         return frames
 
 
-    def _load_frame_det(self, path, id, det_res):
+    def _load_frame_det(self, path, bb):
 
-        # load image
-        img = Image.open(path).convert('RGB')
+        # load image, at full resolution for the box coordinates
+        img = self._open_frame(path).convert('RGB')
 
-        # get box
-        idx = np.where(det_res[:, 0] == id)
-        if len(idx[0])!=0:
-            n = np.argmax(det_res[idx, 2], axis=1)
-            bb = det_res[idx[0][n[0]], 3:]
-            # crop image
+        # crop image, NaN rows of the index mean no detection
+        if bb is not None and not np.isnan(bb[0]):
             img = img.crop((bb[0], bb[1], bb[2], bb[3]))
         return img
 
+    def _list_frames(self, frame_dir):
+        # sorted frame file names of a video
+        if self.frame_pack is not None:
+            return self.frame_pack.get(frame_dir).names
+        return sorted(os.listdir(frame_dir))
+
+    def _open_frame(self, path, min_edge=None):
+        if self.frame_pack is not None:
+            img = Image.open(io.BytesIO(self.frame_pack.read(path)))
+        else:
+            img = Image.open(path)
+        if self.jpeg_draft and min_edge is not None:
+            # let libjpeg decode at 1/2, 1/4 or 1/8 scale, keeping both edges
+            # >= min_edge so the resize transform still only downsamples
+            img.draft('RGB', (min_edge, min_edge))
+        return img
+
     def _load_frame(self, path):
-        img = Image.open(path).convert('RGB')
+        img = self._open_frame(path, int(self.imgSize * 1.1)).convert('RGB')
         return img
 
-    def _stft(self, audio):
+    def _stft(self, audio, windows=None, with_phase=True):
+        # windows: [(path, center_timestamp), ...] the audio was built from,
+        # used as the STFT cache key
+        key = None
+        if self.stft_cache is not None and windows is not None:
+            key = self.stft_cache.key(windows)
+            cached = self.stft_cache.get(key, with_phase=with_phase)
+            if cached is not None:
+                amp, phase = cached
+                return torch.from_numpy(amp), None if phase is None else torch.from_numpy(phase)
+
         spec = librosa.stft(
             audio, n_fft=self.stft_frame, hop_length=self.stft_hop)
         amp = np.abs(spec)
         phase = np.angle(spec)
+        if key is not None:
+            self.stft_cache.put(key, amp, phase if with_phase else None)
         return torch.from_numpy(amp), torch.from_numpy(phase)
 
     def _load_audio_file(self, path):
@@ -198,37 +398,90 @@ class BaseDataset(torchdata.Dataset):
 
         return audio_raw, rate
 
-    def _load_audio(self, path, center_timestamp, nearest_resample=False):
+    def _seek_audio(self, path, center_timestamp, audio_info=None):
+        # Decodes only the samples _load_audio crops (plus resampler context)
+        # instead of the whole file. Returns (audio, len_raw, base) where
+        # audio[i] is sample base + i of the full resampled signal of length
+        # len_raw, or None for files that need the full decode (mp3, too
+        # short and therefore tiled). audio_info: (sample rate, number of
+        # samples) from a manifest, saves the sf.info call.
+        if path.endswith('.mp3'):
+            return None
+        if audio_info is None:
+            info = sf.info(path)
+            audio_info = info.samplerate, info.frames
+        rate, num_samples = audio_info
+        resample = rate > self.audRate
+        len_raw = -(-num_samples * self.audRate // rate) if resample else num_samples
+        if len_raw < self.audRate * self.audSec:
+            return None
+
+        center = int(center_timestamp * self.audRate)
+        start = max(0, center - self.audLen // 2)
+        end = min(len_raw, center + self.audLen // 2)
+        if resample:
+            # start on an input sample that maps to a whole output sample so
+            # the resampled span lines up with the full-file resampling
+            step = rate // math.gcd(rate, self.audRate)
+            src_start = max(0, (start - SEEK_PAD) * rate // self.audRate // step * step)
+            src_stop = min(num_samples, -(-(end + SEEK_PAD) * rate // self.audRate))
+            base = src_start * self.audRate // rate
+        else:
+            src_start, src_stop, base = start, end, start
+
+        audio_raw, _ = sf.read(path, start=src_start, stop=src_stop,
+                               dtype='float32', always_2d=True)
+        audio_raw = audio_raw.mean(axis=1)
+        if resample:
+            audio_raw = librosa.resample(audio_raw, orig_sr=rate, target_sr=self.audRate)
+        return audio_raw, len_raw, base
+
+    def _load_audio(self, path, center_timestamp, nearest_resample=False, audio_info=None):
         audio = np.zeros(self.audLen, dtype=np.float32)
 
         # silent
         if path.endswith('silent'):
             return audio
 
-        # load audio
-        audio_raw, rate = self._load_audio_file(path)
+        store_key = os.path.normpath(path)
+        in_store = self.audio_store is not None and store_key in self.audio_store
+        window = None
+        if self.audio_seek and not in_store and not nearest_resample:
+            window = self._seek_audio(path, center_timestamp, audio_info)
 
-        # resample
-        if rate > self.audRate:
-            # print('resmaple {}->{}'.format(rate, self.audRate))
-            if nearest_resample:
-                audio_raw = audio_raw[::rate//self.audRate]
+        if window is not None:
+            # resampled span starting at sample `base` of the full signal
+            audio_raw, len_raw, base = window
+        else:
+            base = 0
+            if in_store:
+                # already resampled to audRate, only the cropped window is read
+                audio_raw = self.audio_store[store_key]
             else:
-                audio_raw = librosa.resample(audio_raw, orig_sr=rate, target_sr=self.audRate)
-
-        # repeat if audio is too short
-        if audio_raw.shape[0] < self.audRate * self.audSec:
-            n = int(self.audRate * self.audSec / audio_raw.shape[0]) + 1
-            audio_raw = np.tile(audio_raw, n)
+                # load audio
+                audio_raw, rate = self._load_audio_file(path)
+
+                # resample
+                if rate > self.audRate:
+                    # print('resmaple {}->{}'.format(rate, self.audRate))
+                    if nearest_resample:
+                        audio_raw = audio_raw[::rate//self.audRate]
+                    else:
+                        audio_raw = librosa.resample(audio_raw, orig_sr=rate, target_sr=self.audRate)
+
+            # repeat if audio is too short
+            if audio_raw.shape[0] < self.audRate * self.audSec:
+                n = int(self.audRate * self.audSec / audio_raw.shape[0]) + 1
+                audio_raw = np.tile(audio_raw, n)
+            len_raw = audio_raw.shape[0]
 
         # crop N seconds
-        len_raw = audio_raw.shape[0]
         center = int(center_timestamp * self.audRate) # 55000 => 센터프레임스텝 5로 고정을 시켜놨어 ave에서
         start = max(0, center - self.audLen // 2)
         end = min(len_raw, center + self.audLen // 2)
 
         audio[self.audLen//2-(center-start): self.audLen//2+(end-center)] = \
-            audio_raw[start:end]
+            audio_raw[start - base:end - base]
 
         # randomize volume
         if self.split == 'train':
@@ -239,19 +492,28 @@ class BaseDataset(torchdata.Dataset):
 
         return audio
 
-    def _mix_n_and_stft(self, audios):
+    def _mix_n(self, audios):
         N = len(audios)
-        mags = [None for n in range(N)]
-
         audio_mix = 0
         for n in range(N):
             audio_mix += audios[n]
         audio_mix /= N
+        return audio_mix
+
+    def _mix_n_and_stft(self, audios, windows=None):
+        N = len(audios)
+        mags = [None for n in range(N)]
+        if windows is None:
+            windows = [None for n in range(N)]
+
+        audio_mix = self._mix_n(audios)
 
         # STFT
-        amp_mix, phase_mix = self._stft(audio_mix)
+        amp_mix, phase_mix = self._stft(
+            audio_mix, None if None in windows else windows)
         for n in range(N):
-            ampN, _ = self._stft(audios[n])
+            ampN, _ = self._stft(
+                audios[n], None if windows[n] is None else [windows[n]], with_phase=False)
             mags[n] = ampN.unsqueeze(0)
 
         for n in range(N):
@@ -267,9 +529,14 @@ class BaseDataset(torchdata.Dataset):
         amp_mix = torch.zeros(1, self.HS, self.WS)
         phase_mix = torch.zeros(1, self.HS, self.WS)
 
+        T = len(range(self.num_frames)[self.frame_slice])
         for n in range(N):
-            frames[n] = torch.zeros(
-                3, self.num_frames, self.imgSize, self.imgSize)
+            if self.frame_features is not None:
+                frames[n] = torch.zeros(
+                    T, *self.frame_features.shape)
+            else:
+                frames[n] = torch.zeros(
+                    3, T, self.imgSize, self.imgSize)
             audios[n] = torch.zeros(self.audLen)
             mags[n] = torch.zeros(1, self.HS, self.WS)
         return amp_mix, mags, frames, audios, phase_mix
@@ -0,0 +1,54 @@
+import torch
+from torch.utils.data.dataloader import default_collate
+from modules.stft import batch_spectrograms
+from .partners import ClassPartnerSampler
+
+
+class BatchMixCollate(object):
+    """Collate for --batch_mix: builds num_mix-source mixtures from solo clips.
+
+    Every clip of the batch is the first source of one mixture, and its
+    partners are drawn from the other clips of the batch whose classes are not
+    in the mixture yet. B decoded clips therefore give B mixtures instead of
+    B / num_mix. A clip that finds no partner (too few classes in the batch)
+    is dropped, and None is returned if that leaves nothing.
+
+    The output has the layout of the MUSIC/AVE train items. Magnitudes are
+    computed here with torch.stft unless --gpu_stft leaves them to NetWrapper.
+    """
+
+    def __init__(self, opt):
+        self.opt = opt
+        self.num_mix = opt.num_mix
+
+    def __call__(self, batch):
+        labels = [item['class'] for item in batch]
+        sampler = ClassPartnerSampler(labels)
+        mixtures = []
+        for i in range(len(batch)):
+            members, classes = [i], [labels[i]]
+            try:
+                for n in range(1, self.num_mix):
+                    j = sampler.sample(classes)
+                    members.append(j)
+                    classes.append(labels[j])
+            except ValueError:
+                continue
+            mixtures.append(members)
+        if len(mixtures) == 0:
+            return None
+
+        solo = default_collate(batch)
+        index = torch.tensor(mixtures)
+        ret_dict = {}
+        for key, value in solo.items():
+            if torch.is_tensor(value):
+                ret_dict[key] = [value[index[:, n]] for n in range(self.num_mix)]
+            else:
+                ret_dict[key] = [[value[m[n]] for m in mixtures] for n in range(self.num_mix)]
+        ret_dict['audios'] = ret_dict.pop('audio')
+        ret_dict['audio_mix'] = torch.stack(ret_dict['audios']).mean(0)
+
+        if not self.opt.gpu_stft:
+            batch_spectrograms(ret_dict, self.opt, with_phase=False, device='cpu')
+        return ret_dict
@@ -0,0 +1,109 @@
+import os
+import struct
+from collections import OrderedDict
+
+# <frame_dir>.fpk layout:
+#   header   magic, number of frames, byte length of the names block
+#   entries  (offset, length) of each frame's JPEG bytes, in name order
+#   names    '\n'-joined frame file names
+#   data     the JPEG files, concatenated
+MAGIC = b'FPK1'
+_HEADER = struct.Struct('<4sII')
+_ENTRY = struct.Struct('<QI')
+PACK_EXT = '.fpk'
+
+
+def pack_path(frame_dir):
+    return os.path.normpath(frame_dir) + PACK_EXT
+
+
+class FramePack(object):
+    """All JPEG frames of one video in a single file.
+
+    The header is read once on open. After that every frame costs a single
+    pread, with no directory listing or per-frame open/stat.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        try:
+            magic, count, names_len = _HEADER.unpack(os.pread(self.fd, _HEADER.size, 0))
+            if magic != MAGIC:
+                raise ValueError('{} is not a frame pack'.format(path))
+            table = os.pread(self.fd, count * _ENTRY.size + names_len, _HEADER.size)
+        except Exception:
+            os.close(self.fd)
+            raise
+        self.names = table[count * _ENTRY.size:].decode('utf-8').split('\n') if count else []
+        self.entries = {name: _ENTRY.unpack_from(table, i * _ENTRY.size)
+                        for i, name in enumerate(self.names)}
+
+    def read(self, name):
+        offset, length = self.entries[name]
+        return os.pread(self.fd, length, offset)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FramePackCache(object):
+    """Keeps the most recently used packs open, per process.
+
+    Open descriptors are not carried into DataLoader workers: they are dropped
+    on pickling (spawn) and when the cache notices it runs in a new pid (fork).
+    """
+
+    def __init__(self, max_open=256):
+        self.max_open = max_open
+        self._pid = None
+        self._packs = OrderedDict()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pid'] = None
+        state['_packs'] = OrderedDict()
+        return state
+
+    def get(self, frame_dir):
+        if self._pid != os.getpid():
+            # forked: close the inherited copies and open our own
+            for pack in self._packs.values():
+                pack.close()
+            self._pid = os.getpid()
+            self._packs = OrderedDict()
+        path = pack_path(frame_dir)
+        pack = self._packs.pop(path, None)
+        if pack is None:
+            pack = FramePack(path)
+            if len(self._packs) >= self.max_open:
+                self._packs.popitem(last=False)[1].close()
+        self._packs[path] = pack
+        return pack
+
+    def read(self, path):
+        frame_dir, name = os.path.split(path)
+        return self.get(frame_dir).read(name)
+
+
+def write_frame_pack(frame_dir, names=None, out_path=None):
+    if names is None:
+        names = sorted(f for f in os.listdir(frame_dir) if f.lower().endswith('.jpg'))
+    out_path = out_path or pack_path(frame_dir)
+    blobs = []
+    for name in names:
+        with open(os.path.join(frame_dir, name), 'rb') as f:
+            blobs.append(f.read())
+
+    names_block = '\n'.join(names).encode('utf-8')
+    offset = _HEADER.size + len(names) * _ENTRY.size + len(names_block)
+    with open(out_path + '.tmp', 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(names), len(names_block)))
+        for blob in blobs:
+            f.write(_ENTRY.pack(offset, len(blob)))
+            offset += len(blob)
+        f.write(names_block)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(out_path + '.tmp', out_path)
+    return len(names)
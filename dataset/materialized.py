@@ -0,0 +1,144 @@
+import os
+import json
+import numpy as np
+import torch
+import torch.utils.data as torchdata
+
+# options that change what a val/test item contains, checked on load.
+# frame_pack is left out on purpose: packs hold the same JPEG bytes
+ITEM_OPTIONS = ['num_mix', 'num_frames', 'stride_frames', 'frameRate', 'imgSize',
+                'audRate', 'audLen', 'stft_frame', 'stft_hop', 'arch_frame',
+                'frame_features', 'frame_select', 'frames_det', 'tensor_transform', 'jpeg_draft',
+                'gpu_stft', 'seed']
+# the items themselves: which list they come from and which split's mixing
+SOURCE_OPTIONS = ['split', 'list_val']
+
+
+def _options(opt):
+    options = {k: getattr(opt, k, None) for k in ITEM_OPTIONS + SOURCE_OPTIONS}
+    if options['list_val']:
+        options['list_val'] = os.path.normpath(options['list_val'])
+    return options
+
+
+def _is_array(value):
+    return torch.is_tensor(value) or isinstance(value, np.ndarray)
+
+
+class MaterializedWriter(object):
+    """Writes dataset items to `root` as one .npy memmap per array field.
+
+    Tensors become `<key>.npy`, lists of tensors `<key>.<n>.npy`, each with a
+    leading item axis. Everything else (infos, class names) is kept as JSON
+    in items.json, and meta.json records the layout and the item options.
+    Items are added in index order; if fewer than num_items were added
+    (items that failed to load), close() trims the arrays to that count.
+    """
+
+    def __init__(self, root, num_items, opt):
+        self.root = root
+        self.num_items = num_items
+        self.meta = {'num_items': num_items, 'fields': {},
+                     'options': _options(opt)}
+        self.arrays = {}
+        self.extras = []
+        os.makedirs(root, exist_ok=True)
+
+    def _array(self, name, value):
+        value = value.numpy() if torch.is_tensor(value) else np.asarray(value)
+        if name not in self.arrays:
+            self.arrays[name] = np.lib.format.open_memmap(
+                os.path.join(self.root, name + '.npy.tmp'), mode='w+',
+                dtype=value.dtype, shape=(self.num_items,) + value.shape)
+        return self.arrays[name], value
+
+    def add(self, index, item):
+        extras = {}
+        for key, value in item.items():
+            if _is_array(value):
+                self.meta['fields'][key] = 'array'
+                array, value = self._array(key, value)
+                array[index] = value
+            elif isinstance(value, list) and len(value) > 0 and all(_is_array(v) for v in value):
+                self.meta['fields'][key] = ['array'] * len(value)
+                for n, v in enumerate(value):
+                    array, v = self._array('{}.{}'.format(key, n), v)
+                    array[index] = v
+            else:
+                self.meta['fields'][key] = 'json'
+                extras[key] = value
+        self.extras.append(extras)
+
+    def close(self):
+        count = len(self.extras)
+        self.meta['num_items'] = count
+        # pop each memmap so the mapping is released before its rename
+        while self.arrays:
+            name, array = self.arrays.popitem()
+            tmp, path = (os.path.join(self.root, name + ext) for ext in ['.npy.tmp', '.npy'])
+            if count < self.num_items:
+                trimmed = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=array.dtype, shape=(count,) + array.shape[1:])
+                trimmed[:] = array[:count]
+                trimmed.flush()
+                del trimmed, array
+                os.remove(tmp)
+            else:
+                array.flush()
+                del array
+                os.replace(tmp, path)
+        with open(os.path.join(self.root, 'items.json'), 'w') as f:
+            json.dump(self.extras, f)
+        with open(os.path.join(self.root, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+
+class MaterializedDataset(torchdata.Dataset):
+    """Val/test items written by preprocessing/materialize_eval.py.
+
+    Returns the same dicts as the dataset that was materialized, read from
+    memory-mapped arrays with no decoding, resampling, mixing or STFT.
+    """
+
+    def __init__(self, root, opt, max_sample=-1):
+        self.root = root
+        with open(os.path.join(root, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        options = _options(opt)
+        for key, value in self.meta['options'].items():
+            if options.get(key) != value:
+                raise ValueError('eval store {} was materialized with {}={}, got {}'.format(
+                    root, key, value, options.get(key)))
+        with open(os.path.join(root, 'items.json'), 'r') as f:
+            self.extras = json.load(f)
+        self.num_items = self.meta['num_items']
+        if max_sample > 0:
+            self.num_items = min(self.num_items, max_sample)
+        self._arrays = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __len__(self):
+        return self.num_items
+
+    def _array(self, name):
+        if self._arrays is None:
+            self._arrays = {}
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.root, name + '.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def __getitem__(self, index):
+        ret_dict = {}
+        for key, kind in self.meta['fields'].items():
+            if kind == 'json':
+                ret_dict[key] = self.extras[index][key]
+            elif kind == 'array':
+                ret_dict[key] = torch.from_numpy(np.array(self._array(key)[index]))
+            else:
+                ret_dict[key] = [torch.from_numpy(np.array(self._array('{}.{}'.format(key, n))[index]))
+                                 for n in range(len(kind))]
+        return ret_dict
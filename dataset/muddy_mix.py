@@ -3,7 +3,6 @@ import random
 import numpy as np
 import csv
 from .base import BaseDataset
-import clip
 import torch
 
 
@@ -19,61 +18,93 @@ class MuddyMixDataset(BaseDataset):
         self.root_dir = root_dir
 
 
-    def make_stft(self, audio_raw, audio_sep):
-        amp_mix, phase_mix = self._stft(audio_raw)
-        ampN, _ = self._stft(audio_sep)
+    def make_stft(self, audio_raw, audio_sep, windows=(None, None)):
+        # windows: (path, center_timestamp) of the raw and separated audio
+        window_raw, window_sep = windows
+        amp_mix, phase_mix = self._stft(audio_raw, None if window_raw is None else [window_raw])
+        ampN, _ = self._stft(audio_sep, None if window_sep is None else [window_sep], with_phase=False)
         mag = ampN.unsqueeze(0)
         audio_sep = torch.from_numpy(audio_sep)
 
         return amp_mix.unsqueeze(0), mag, phase_mix.unsqueeze(0), torch.from_numpy(audio_raw)
 
-    def __getitem__(self, index):
-        info = self.list_sample[index]
-        video_name = info['Video_Name']
-        sub_video_name = info['SubVideo_Name']
-        video_path = os.path.join(self.root_dir, video_name, 'sub_video', sub_video_name)
-        raw_audio_path = os.path.join(video_path, 'audio_raw', f'{sub_video_name}.wav')
-        audio_sep_path = os.path.join(video_path, 'separated', 'speech.wav') # NOTE 여기 바꿔야 함 나중에
-        text = clip.tokenize('an image of human speaking')
-        frame_files = sorted([f for f in os.listdir(os.path.join(video_path, 'frames'))])
-        path_frames = [os.path.join(video_path,'frames', f) for f in frame_files]
-        num_frames = len(path_frames)
-        assert num_frames !=0, f"이상해 뭔가 : {path_frames}"
+    @staticmethod
+    def select_center_frames(frame_files, num_select):
+        """num_select consecutive frames around the center of frame_files."""
+        num_frames = len(frame_files)
+        assert num_frames !=0, f"이상해 뭔가 : {frame_files}"
         center = num_frames // 2
-        half = self.num_frames // 2
+        half = num_select // 2
         start = max(0, center - half)
-        end = min(num_frames, center + half + self.num_frames % 2)
-        selected = path_frames[start:end]
+        end = min(num_frames, center + half + num_select % 2)
+        selected = frame_files[start:end]
 
         # 길이가 부족하면 앞/뒤 프레임을 반복해서 채움
-        while len(selected) < self.num_frames:
+        while len(selected) < num_select:
             if start > 0:
                 start -= 1
-                selected.insert(0, path_frames[start])
+                selected.insert(0, frame_files[start])
             elif end < num_frames:
-                selected.append(path_frames[end])
+                selected.append(frame_files[end])
                 end += 1
             else:  # 정말 짧은 영상이면 마지막 프레임 반복
                 selected.append(selected[-1])
 
         # 더 길면 여기서 잘라줌
-        selected = selected[:self.num_frames]
-        path_frames = selected
+        return selected[:num_select]
+
+    def _select_frames(self, info, video_path):
+        # manifest rows (preprocessing/build_muddy_manifest.py) carry the
+        # frame count and selection, other rows need a listing of frames/
+        if info.get('Num_Frames') == str(self.num_frames) and info.get('Selected_Frames'):
+            num_frames = int(info['Frame_Count'])
+            selected = info['Selected_Frames'].split('|')
+        else:
+            frame_files = self._list_frames(os.path.join(video_path, 'frames'))
+            num_frames = len(frame_files)
+            selected = self.select_center_frames(frame_files, self.num_frames)
+        return [os.path.join(video_path, 'frames', f) for f in selected], num_frames
+
+    def _audio_info(self, info, prefix):
+        # (sample rate, number of samples) from a manifest row, lets
+        # _seek_audio skip sf.info; None for rows without the columns
+        if info.get(prefix + '_Rate') and info.get(prefix + '_Samples'):
+            return int(info[prefix + '_Rate']), int(info[prefix + '_Samples'])
+        return None
+
+    def __getitem__(self, index):
+        info = self.list_sample[index]
+        video_name = info['Video_Name']
+        sub_video_name = info['SubVideo_Name']
+        video_path = os.path.join(self.root_dir, video_name, 'sub_video', sub_video_name)
+        raw_audio_path = os.path.join(video_path, 'audio_raw', f'{sub_video_name}.wav')
+        audio_sep_path = os.path.join(video_path, 'separated', 'speech.wav') # NOTE 여기 바꿔야 함 나중에
+        path_frames, num_frames = self._select_frames(info, video_path)
         # load frames and audios, STFT
         try:
             if self.model_type != 'clip':
-                frames = self._load_frames(path_frames)
+                frames = self._load_frames(self._consumed(path_frames))
             else:
-                frames = self._load_frames_clip(path_frames)
+                frames = self._load_frames_clip(self._consumed(path_frames))
                 
             # jitter audio
             center_timeN = num_frames // 2
-            audio_raw = self._load_audio(raw_audio_path, center_timeN)
-            audio_sep = self._load_audio(audio_sep_path, center_timeN)
-            mag_mix, mag, phase_mix, audio_mix = self.make_stft(audio_raw, audio_sep)
+            audio_raw = self._load_audio(raw_audio_path, center_timeN,
+                                         audio_info=self._audio_info(info, 'Raw_Audio'))
+            audio_sep = self._load_audio(audio_sep_path, center_timeN,
+                                         audio_info=self._audio_info(info, 'Speech'))
+            if self.gpu_stft:
+                audio_mix = torch.from_numpy(audio_raw)
+            else:
+                mag_mix, mag, phase_mix, audio_mix = self.make_stft(
+                    audio_raw, audio_sep,
+                    ((raw_audio_path, center_timeN), (audio_sep_path, center_timeN)))
 
         except Exception as e:
             print('Failed loading frame/audio: {}'.format(e))
+            if self._quarantine_sample(info, e):
+                # dropped by error_avoidance_collate, skipped in later epochs
+                return None
             # create dummy data
             raise e
             #return None
@@ -81,15 +112,18 @@ class MuddyMixDataset(BaseDataset):
             #     self.dummy_mix_data(N)
             # audio_mix = audios[0]
 
-        ret_dict = {'mag_mix': mag_mix, 'frames': frames, 'mags': mag, 
-        'audio_mix': audio_mix}
+        ret_dict = {'frames': frames, 'audio_mix': audio_mix}
+        if not self.gpu_stft:
+            ret_dict['mag_mix'] = mag_mix
+            ret_dict['mags'] = mag
         ret_dict['audios'] = audio_sep
         # ret_dict['class'] = classes
         # ret_dict['text'] = texts
 
         if self.split != 'train':
             # ret_dict['audios'] = audios
-            ret_dict['phase_mix'] = phase_mix
+            if not self.gpu_stft:
+                ret_dict['phase_mix'] = phase_mix
             ret_dict['infos'] = info
 
         # return ret_dict # mix 한거 : 원본, mags: sep한 speech (아니면 foley나 뭐 등등 ?)
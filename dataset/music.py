@@ -1,11 +1,15 @@
 import os
 import random
 import numpy as np
+import torch
 import csv
-from .base import BaseDataset
+from .base import BaseDataset, build_csv_index
+from .partners import ClassPartnerSampler
 
 
 class MUSICMixDataset(BaseDataset):
+    test_manifest = "../data/Music/test.csv"
+
     def __init__(self, list_sample, opt, **kwargs):
         super(MUSICMixDataset, self).__init__(
             list_sample, opt, **kwargs)
@@ -13,8 +17,24 @@ class MUSICMixDataset(BaseDataset):
         self.num_mix = opt.num_mix
         self.audLen = opt.audLen
 
+        # parsed once here so that forked workers share it
+        self.test_index = None
+        self.partner_sampler = None
+        if self.split not in ('train', 'val'):
+            self.test_index = build_csv_index(self.test_manifest)
+        else:
+            self.partner_sampler = ClassPartnerSampler(
+                self._sample_class(sample) for sample in self.list_sample)
+            if self.partner_sampler.num_classes < self.num_mix:
+                raise ValueError('cannot mix {} sources from {} classes'.format(
+                    self.num_mix, self.partner_sampler.num_classes))
+
+    def _sample_class(self, sample):
+        return sample[0].split('/')[1]
+
     def __getitem__(self, index):
-        N = self.num_mix
+        # solo clips with --batch_mix, mixed by BatchMixCollate
+        N = 1 if self.batch_mix else self.num_mix
         frames = [None for n in range(N)]
         audios = [None for n in range(N)]
         infos = [[] for n in range(N)]
@@ -23,55 +43,33 @@ class MUSICMixDataset(BaseDataset):
         path_frames_det = ['' for n in range(N)]
         path_audios = ['' for n in range(N)]
         center_frames = [0 for n in range(N)]
+        windows = [None for n in range(N)]
         class_list = []
 
-        if self.split == 'train':
+        if self.split in ('train', 'val'):
             # the first video
             infos[0] = self.list_sample[index]
-            cls = infos[0][0].split('/')[1]
-            class_list.append(cls)
+            class_list.append(self._sample_class(infos[0]))
+            # val mixtures are fixed by the seed and the index
+            rng = random if self.split == 'train' else random.Random(self.seed + index)
             for n in range(1, N):
-                indexN = random.randint(0, len(self.list_sample)-1)
-                sample = self.list_sample[indexN]
-                while sample[0].split('/')[1] in class_list:
-                    indexN = random.randint(0, len(self.list_sample) - 1)
-                    sample = self.list_sample[indexN]
-                infos[n] = sample
-                class_list.append(sample[0].split('/')[1])
-        elif self.split == 'val':
-            infos[0] = self.list_sample[index]
-            cls = infos[0][0].split('/')[1]
-            class_list.append(cls)
-            if not self.split == 'train':
-                random.seed(1234)
-
-            for n in range(1, N):
-                indexN = random.randint(0, len(self.list_sample) - 1)
-                sample = self.list_sample[indexN]
-                while sample[0].split('/')[1] in class_list:
-                    indexN = random.randint(0, len(self.list_sample) - 1)
-                    print(indexN)
-                    sample = self.list_sample[indexN]
+                sample = self.list_sample[self.partner_sampler.sample(class_list, rng)]
+                # redraw quarantined train partners; val keeps its fixed
+                # mixture and falls back to dummy data if a partner fails
+                for _ in range(10 if self.split == 'train' else 0):
+                    if not self._is_quarantined(sample):
+                        break
+                    sample = self.list_sample[self.partner_sampler.sample(class_list, rng)]
                 infos[n] = sample
-                class_list.append(sample[0].split('/')[1])
+                class_list.append(self._sample_class(sample))
         else:
-            csv_lis_path = "../data/Music/test.csv"
-            csv_lis = []
-            for row in csv.reader(open(csv_lis_path, 'r'), delimiter=','):
-                if len(row) < 2:
-                    continue
-                csv_lis.append(row)
             random.seed(index) # fixed
             samples_4 = self.list_sample[index]
             samples = samples_4
             # samples = samples_4[::2]
             for n in range(N):
                 sample = samples[n].replace(" ", "")
-                for i in range(len(csv_lis)):
-                    data = csv_lis[i]
-                    if sample in data: 
-                        infos[n] = data
-                        break
+                infos[n] = self.test_index.get(sample, [])
 
         # select frames
         idx_margin = self.num_frames // 2 * self.stride_frames
@@ -110,28 +108,51 @@ class MUSICMixDataset(BaseDataset):
             path_audios[n] = os.path.join("/YOUR_ROOT/MUSIC/audio", path_audioN[1:])
         
         # load frames and audios, STFT
+        failed = None
         try:
             for n, infoN in enumerate(infos):
-                frames[n] = self._load_frames(path_frames[n])
+                failed = infoN
+                if self.frames_det:
+                    frames[n] = self._load_frames_det(
+                        self._consumed(path_frames[n]), self._consumed(path_frames_ids[n]),
+                        path_frames_det[n])
+                else:
+                    frames[n] = self._load_frames(self._consumed(path_frames[n]))
 
                 # jitter audio
                 center_timeN = (center_frames[n] - 0.5) / self.fps
                 audios[n] = self._load_audio(path_audios[n], center_timeN)
-            mag_mix, mags, phase_mix, audio_mix = self._mix_n_and_stft(audios)
+                windows[n] = (path_audios[n], center_timeN)
+            failed = None
+            if self.batch_mix:
+                audios = [torch.from_numpy(audio) for audio in audios]
+            elif self.gpu_stft:
+                audio_mix = self._mix_n(audios)
+                audios = [torch.from_numpy(audio) for audio in audios]
+            else:
+                mag_mix, mags, phase_mix, audio_mix = self._mix_n_and_stft(audios, windows)
 
         except Exception as e:
             print('Failed loading frame/audio: {}'.format(e))
+            if failed is not None:
+                self._quarantine_sample(failed, e)
             # create dummy data
             mag_mix, mags, frames, audios, phase_mix = \
                 self.dummy_mix_data(N)
             audio_mix = audios[0]
 
-        ret_dict = {'mag_mix': mag_mix, 'frames': frames, 'mags': mags, 
-        'audio_mix': audio_mix}
+        if self.batch_mix:
+            return {'frames': frames[0], 'audio': audios[0], 'class': class_list[0]}
+
+        ret_dict = {'frames': frames, 'audio_mix': audio_mix}
+        if not self.gpu_stft:
+            ret_dict['mag_mix'] = mag_mix
+            ret_dict['mags'] = mags
         ret_dict['audios'] = audios
         if self.split != 'train':
             # ret_dict['audios'] = audios
-            ret_dict['phase_mix'] = phase_mix
+            if not self.gpu_stft:
+                ret_dict['phase_mix'] = phase_mix
             ret_dict['infos'] = infos
 
         return ret_dict
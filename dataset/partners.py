@@ -0,0 +1,42 @@
+import random
+import numpy as np
+
+
+class ClassPartnerSampler(object):
+    """Draws mixing partners from classes not yet in the mixture.
+
+    Item indices are grouped by class into contiguous ranges. A draw picks a
+    position among the items outside the excluded classes and shifts it past
+    the excluded ranges, so it costs O(k log k) for k classes already in the
+    mixture instead of a rejection loop over the whole sample list. Like the
+    rejection loop it is uniform over the eligible items.
+    """
+
+    def __init__(self, labels):
+        labels = list(labels)
+        classes = sorted(set(labels))
+        self.class_id = {c: i for i, c in enumerate(classes)}
+        ids = np.array([self.class_id[c] for c in labels], dtype=np.int64)
+        self.order = np.argsort(ids, kind='stable')
+        self.counts = np.bincount(ids, minlength=len(classes))
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.total = len(labels)
+
+    @property
+    def num_classes(self):
+        return len(self.class_id)
+
+    def sample(self, exclude, rng=random):
+        # exclude: class labels already in the mixture
+        ids = {self.class_id[c] for c in exclude if c in self.class_id}
+        ranges = sorted((int(self.starts[i]), int(self.counts[i])) for i in ids)
+        remaining = self.total - sum(count for _, count in ranges)
+        if remaining <= 0:
+            raise ValueError('no sample left outside classes {}'.format(sorted(exclude)))
+
+        pos = rng.randrange(remaining)
+        for start, count in ranges:
+            if pos < start:
+                break
+            pos += count
+        return int(self.order[pos])
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import time
+
+
+class Quarantine(object):
+    """Registry of samples that failed to load, shared by workers and runs.
+
+    Rows of list_sample are keyed by their SampleList encoding, so the
+    registry stays valid when the list is reordered or extended. Workers add
+    failures as they happen. The SQLite db is in WAL mode, so those writes
+    do not block readers, and every process opens its own connection. Reads
+    go through a per-process set loaded on first use; forked workers
+    therefore see everything recorded before their epoch started.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._pid = None
+        self._conn = None
+        self._keys = None
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS bad '
+                     '(key TEXT PRIMARY KEY, error TEXT, time REAL)')
+        conn.commit()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pid'] = None
+        state['_conn'] = None
+        state['_keys'] = None
+        return state
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._keys = None
+        return self._conn
+
+    def keys(self):
+        conn = self._connect()
+        if self._keys is None:
+            self._keys = {row[0] for row in conn.execute('SELECT key FROM bad')}
+        return self._keys
+
+    def refresh(self):
+        self._connect()
+        self._keys = None
+        return self.keys()
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __len__(self):
+        return len(self.keys())
+
+    def add(self, key, error):
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO bad VALUES (?, ?, ?)',
+                         (key, repr(error), time.time()))
+        self.keys().add(key)
@@ -0,0 +1,83 @@
+import json
+import numpy as np
+import torch.utils.data as torchdata
+
+
+class SampleList(object):
+    """Read-only list of manifest rows packed into one byte blob.
+
+    Every row (a csv list or a DictReader dict) is JSON-encoded into a single
+    uint8 array with int64 offsets. Forked DataLoader workers share these two
+    arrays without touching per-row Python objects, so reading a row never
+    bumps a shared refcount and copies the page it lives on. Rows are decoded
+    on access and a fresh object is returned every time.
+    """
+
+    def __init__(self, rows):
+        blobs = [self.encode(row).encode('utf-8') for row in rows]
+        self.offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in blobs], out=self.offsets[1:])
+        self.blob = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+
+    @staticmethod
+    def encode(row):
+        # also a stable key of the row, see dataset/quarantine.py
+        return json.dumps(row, separators=(',', ':'))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def raw(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('sample index {} out of range'.format(index))
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.blob[start:end].tobytes().decode('utf-8')
+
+    def __getitem__(self, index):
+        return json.loads(self.raw(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class VirtualEpochSampler(torchdata.Sampler):
+    """Shuffled epoch over `dup` virtual copies of a dataset of size n.
+
+    Replaces duplicating list_sample `dup` times: an epoch visits every index
+    `dup` times in random order, drawing a new order for each epoch.
+    `exclude`, if given, returns indices to leave out (see
+    BaseDataset.quarantined_indices). It is called on construction and by
+    set_epoch(), so len() of the coming epoch already accounts for it;
+    call set_epoch() before every epoch.
+    """
+
+    def __init__(self, n, dup=1, seed=0, exclude=None):
+        self.n = n
+        self.dup = dup
+        self.seed = seed
+        self.exclude = exclude
+        self.excluded = np.zeros(0, dtype=np.int64)
+        self.avoided = 0
+        self.set_epoch(0)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+        if self.exclude is not None:
+            self.excluded = np.asarray(sorted(self.exclude()), dtype=np.int64)
+
+    def __len__(self):
+        return (self.n - len(self.excluded)) * self.dup
+
+    def __iter__(self):
+        rng = np.random.RandomState((self.seed + self.epoch) % 2**32)
+        self.epoch += 1
+        order = rng.permutation(self.n * self.dup) % self.n
+        if len(self.excluded) > 0:
+            order = order[~np.isin(order, self.excluded)]
+            self.avoided += len(self.excluded) * self.dup
+            print('Quarantine: skipping {} samples, {} loads avoided this epoch, {} in total'
+                  .format(len(self.excluded), len(self.excluded) * self.dup, self.avoided))
+        return iter(order.tolist())
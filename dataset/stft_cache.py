@@ -0,0 +1,86 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+STFT_CACHE_VERSION = 1
+
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class STFTCache(object):
+    """On-disk cache of STFT magnitude (float16) and phase for fixed windows.
+
+    Entries are keyed by a hash of (audio windows, STFT params) and live under
+    `<root>/<params digest>/`, so changing any STFT argument gives a fresh
+    namespace. Namespaces written with other params are left alone, since
+    another run may be using them, unless prune is set.
+    Only deterministic windows (val/test) should be cached.
+
+    phase_dtype: 'float16' keeps the angle as is, 'uint8'/'uint16' quantize
+    it uniformly over [-pi, pi].
+    """
+
+    def __init__(self, root, params, phase_dtype='float16', prune=False):
+        assert phase_dtype in ('float16', 'uint8', 'uint16'), phase_dtype
+        self.params = dict(params, phase_dtype=phase_dtype, version=STFT_CACHE_VERSION)
+        self.phase_dtype = np.dtype(phase_dtype)
+        self.root = os.path.join(root, _digest(self.params)[:16])
+
+        # remove caches built with different STFT arguments, on request only
+        if prune and os.path.isdir(root):
+            for name in os.listdir(root):
+                path = os.path.join(root, name)
+                if path != self.root and os.path.isfile(os.path.join(path, 'params.json')):
+                    print('removing stale STFT cache {}'.format(path))
+                    shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'params.json'), 'w') as f:
+            json.dump(self.params, f)
+
+    def key(self, windows):
+        # windows: list of (path, center_timestamp) the audio was cropped from
+        return _digest([self.params, [[str(p), float(c)] for p, c in windows]])
+
+    def _path(self, key, name):
+        return os.path.join(self.root, key[:2], '{}.{}.npy'.format(key, name))
+
+    def _encode_phase(self, phase):
+        if self.phase_dtype.kind == 'f':
+            return phase.astype(self.phase_dtype)
+        levels = np.iinfo(self.phase_dtype).max
+        return np.round((phase + np.pi) / (2 * np.pi) * levels).astype(self.phase_dtype)
+
+    def _decode_phase(self, phase):
+        if self.phase_dtype.kind == 'f':
+            return phase.astype(np.float32)
+        levels = np.iinfo(self.phase_dtype).max
+        return (phase.astype(np.float32) / levels * (2 * np.pi) - np.pi).astype(np.float32)
+
+    def get(self, key, with_phase=True):
+        mag_path = self._path(key, 'mag')
+        phase_path = self._path(key, 'phase')
+        if not os.path.exists(mag_path) or (with_phase and not os.path.exists(phase_path)):
+            return None
+        try:
+            mag = np.load(mag_path, mmap_mode='r').astype(np.float32)
+            phase = self._decode_phase(np.load(phase_path, mmap_mode='r')) if with_phase else None
+        except (ValueError, OSError):
+            # partially written by a crashed worker, recompute
+            return None
+        return mag, phase
+
+    def put(self, key, mag, phase=None):
+        os.makedirs(os.path.dirname(self._path(key, 'mag')), exist_ok=True)
+        items = [('mag', mag.astype(np.float16))]
+        if phase is not None:
+            items.append(('phase', self._encode_phase(phase)))
+        for name, array in items:
+            path = self._path(key, name)
+            tmp = '{}.{}.tmp'.format(path, os.getpid())
+            with open(tmp, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp, path)
@@ -1,6 +1,7 @@
 import random
 import numbers
 import torchvision.transforms.functional as F
+from torchvision.transforms import InterpolationMode
 from PIL import Image
 import torch
 
@@ -180,3 +181,61 @@ class Stack(object):
             Tensor: a video Tensor of size (C, L, H, W).
         """
         return torch.stack(frames, dim=self.dim)
+
+
+class TensorVideoTransform(object):
+    """Tensor counterpart of Resize -> RandomCrop/CenterCrop ->
+    RandomHorizontalFlip -> ToTensor -> Normalize -> Stack.
+
+    Transforms a stacked uint8 clip (T, H, W, C) into a (C, T, H, W) float
+    tensor, or a batch of equally sized clips (B, T, H, W, C) into
+    (B, C, T, H, W), with one resize call over all frames. The crop offset and
+    flip are drawn once per clip, in the same order as RandomCrop and
+    RandomHorizontalFlip. Bicubic resizing uses antialias=True to follow PIL;
+    pixels may still differ by one uint8 level from the PIL path.
+    """
+
+    def __init__(self, resize, crop, mean, std, train=False,
+                 interpolation=InterpolationMode.BICUBIC, p_flip=0.5):
+        self.resize = resize
+        self.crop = (int(crop), int(crop)) if isinstance(crop, numbers.Number) else crop
+        self.mean = list(mean)
+        self.std = list(std)
+        self.train = train
+        self.interpolation = interpolation
+        self.p_flip = p_flip
+
+    def _crop_flip(self, clip):
+        # clip: (T, C, H, W), shared crop/flip over the frames
+        h, w = clip.shape[-2:]
+        th, tw = self.crop
+        if not self.train:
+            return F.center_crop(clip, [th, tw])
+        i = random.randint(0, h - th)
+        j = random.randint(0, w - tw)
+        clip = clip[..., i:i + th, j:j + tw]
+        if random.random() < self.p_flip:
+            clip = clip.flip(-1)
+        return clip
+
+    def __call__(self, frames):
+        """
+        Args:
+            frames: uint8 array/Tensor (T, H, W, C) or (B, T, H, W, C).
+        Returns:
+            Tensor: (C, T, H, W) or (B, C, T, H, W) normalized video.
+        """
+        x = torch.as_tensor(frames)
+        batched = x.dim() == 5
+        if not batched:
+            x = x.unsqueeze(0)
+        B, T, H, W, C = x.shape
+
+        x = x.permute(0, 1, 4, 2, 3).reshape(B * T, C, H, W)
+        x = F.resize(x, self.resize, self.interpolation, antialias=True)
+        x = x.reshape(B, T, C, *x.shape[-2:])
+        x = torch.stack([self._crop_flip(clip) for clip in x])
+
+        x = F.normalize(x.float().div_(255).flatten(0, 1), self.mean, self.std, inplace=True)
+        x = x.reshape(B, T, C, *self.crop).transpose(1, 2).contiguous()
+        return x if batched else x[0]
@@ -47,6 +47,30 @@ def extract(a, t, x_shape):
     out = a.gather(-1, t)
     return out.reshape(b, *((1,) * (len(x_shape) - 1)))
 
+# classifier-free guidance
+
+def cfg_condition(condition):
+    # [mix, visual_feature, mix_t] with the conditional batch followed by the
+    # unconditional one, mix and visual_feature zeroed as in p_losses(cfg = True)
+    mix, visual_feature = condition[:2]
+    return [torch.cat((mix, torch.zeros_like(mix))),
+            torch.cat((visual_feature, torch.zeros_like(visual_feature)))] + \
+           [torch.cat((c, c)) for c in condition[2:3]]
+
+def cfg_dropout(condition, p):
+    # training side of cfg_condition: mix and visual_feature zeroed for a
+    # random fraction p of the batch, the remaining entries (mix_t) kept
+    mix, visual_feature = condition[:2]
+    keep = (torch.rand(mix.shape[0], device = mix.device) >= p).float()
+    mix = mix * keep.view(-1, *((1,) * (mix.ndim - 1)))
+    visual_feature = visual_feature * keep.view(-1, *((1,) * (visual_feature.ndim - 1)))
+    return [mix, visual_feature] + list(condition[2:])
+
+def guided_output(model, x, t, condition, guidance_scale):
+    # condition from cfg_condition, both branches in one forward
+    out_cond, out_uncond = model(torch.cat((x, x)), torch.cat((t, t)), condition).chunk(2)
+    return out_uncond + guidance_scale * (out_cond - out_uncond)
+
 def linear_beta_schedule(timesteps):
     """
     linear schedule, proposed in original ddpm paper
@@ -243,8 +267,11 @@ class GaussianDiffusion(nn.Module):
         posterior_log_variance_clipped = extract(self.posterior_log_variance_clipped, t, x_t.shape)
         return posterior_mean, posterior_variance, posterior_log_variance_clipped
 
-    def model_predictions(self, x, t, condition, x_self_cond = None, clip_x_start = False):
-        model_output = self.model(x, t, condition)
+    def model_predictions(self, x, t, condition, x_self_cond = None, clip_x_start = False, guidance_scale = 1.):
+        if guidance_scale != 1.:
+            model_output = guided_output(self.model, x, t, condition, guidance_scale)
+        else:
+            model_output = self.model(x, t, condition)
         maybe_clip = partial(torch.clamp, min = -1., max = 1.) if clip_x_start else identity
         # maybe_clip = partial(torch.clamp, min = 0., max = 1.) if clip_x_start else identity
 
@@ -307,30 +334,66 @@ class GaussianDiffusion(nn.Module):
         ret = self.unnormalize(ret)
         return ret
 
-    @torch.no_grad()
-    def ddim_sample(self, condition, shape, return_all_timesteps = False, silence_mask_sampling = False, threshold = 2e-3):
-        batch, device, total_timesteps, sampling_timesteps, eta, objective = shape[0], self.betas.device, self.num_timesteps, self.sampling_timesteps, self.ddim_sampling_eta, self.objective
+    def start_timestep(self, t_start):
+        # diffusion step of flow time t_start (0: pure noise, 1: data)
+        if not 0. <= t_start < 1.:
+            raise ValueError(f't_start must be in [0, 1), got {t_start}')
+        return int(round((1. - t_start) * (self.num_timesteps - 1)))
 
-        times = torch.linspace(-1, total_timesteps - 1, steps = sampling_timesteps + 1)   # [-1, 0, 1, 2, ..., T-1] when sampling_timesteps == total_timesteps
+    def ddim_time_pairs(self, t_start = 0.):
+        times = torch.linspace(-1, self.num_timesteps - 1, steps = self.sampling_timesteps + 1)   # [-1, 0, 1, 2, ..., T-1] when sampling_timesteps == total_timesteps
         times = list(reversed(times.int().tolist()))
         time_pairs = list(zip(times[:-1], times[1:])) # [(T-1, T-2), (T-2, T-3), ..., (1, 0), (0, -1)]
+        # truncated start: skip the steps above start_timestep(t_start), the
+        # final step to x_0 is always kept
+        start = self.start_timestep(t_start)
+        return [(time, time_next) for time, time_next in time_pairs if time <= start] or time_pairs[-1:]
+
+    @torch.no_grad()
+    def ddim_sample_steps(self, condition, shape, silence_mask_sampling = False, threshold = 2e-3, noise = None, precompute_condition = False, guidance_scale = 1., t_start = 0.):
+        """Streaming DDIM: yields (time_next, img) for the initial noise and after every step.
+
+        Nothing is kept between steps, so memory does not grow with
+        sampling_timesteps. noise: optional (sampling_timesteps + 1, *shape)
+        tensor holding the initial image followed by the noise of every step,
+        so that runs (e.g. per-source vs. stacked sources) can be compared exactly.
+        precompute_condition: compute the condition-only part of the model
+        once (model.precompute_condition) instead of at every step.
+        guidance_scale: classifier-free guidance, the conditional and
+        unconditional branches run as one batch of 2 * batch.
+        t_start: truncated start, the chain begins at start_timestep(t_start)
+        from the mixture (condition[0]) noised with q_sample.
+        """
+        batch, device, total_timesteps, sampling_timesteps, eta, objective = shape[0], self.betas.device, self.num_timesteps, self.sampling_timesteps, self.ddim_sampling_eta, self.objective
+
+        time_pairs = self.ddim_time_pairs(t_start)
 
         mix = condition[0].detach()
         silence_mask = (mix < threshold).float()
  
-        img = torch.randn(shape, device = device)
-        mix_t = img + mix
-        condition.append(mix_t)
-        imgs = [img]
+        img = torch.randn(shape, device = device) if noise is None else noise[0].to(device)
+        if t_start > 0:
+            # the mixture as a prior for the source; img is then already
+            # q_sample(mix), the mix_t of p_losses at this step
+            time_start = torch.full((batch,), time_pairs[0][0], device = device, dtype = torch.long)
+            img = self.q_sample(x_start = mix, t = time_start, noise = img)
+            mix_t = img
+        else:
+            mix_t = img + mix
+        # local copy, the caller's condition list is left as it was
+        condition = list(condition[:2]) + [mix_t]
+        if guidance_scale != 1.:
+            condition = cfg_condition(condition)
+        if precompute_condition:
+            condition.append(self.model.precompute_condition(condition))
+        yield time_pairs[0][0], img
 
         x_start = None
-        
-        # noise = torch.randn_like(img)
 
-        for time, time_next in tqdm(time_pairs, desc = 'sampling loop time step'):
+        for step, (time, time_next) in enumerate(tqdm(time_pairs, desc = 'sampling loop time step')):
             time_cond = torch.full((batch,), time, device = device, dtype = torch.long)
             self_cond = x_start if self.self_condition else None
-            pred_noise, x_start, *_ = self.model_predictions(img, time_cond, condition, self_cond, clip_x_start = True)
+            pred_noise, x_start, *_ = self.model_predictions(img, time_cond, condition, self_cond, clip_x_start = True, guidance_scale = guidance_scale)
 
             if silence_mask_sampling:
                 x_start = mix * silence_mask + x_start * (1-silence_mask)
@@ -338,7 +401,7 @@ class GaussianDiffusion(nn.Module):
 
             if time_next < 0:
                 img = x_start
-                imgs.append(img)
+                yield time_next, img
                 continue
 
             alpha = self.alphas_cumprod[time]
@@ -347,17 +410,30 @@ class GaussianDiffusion(nn.Module):
             sigma = eta * ((1 - alpha / alpha_next) * (1 - alpha_next) / (1 - alpha)).sqrt()
             c = (1 - alpha_next - sigma ** 2).sqrt()
 
-            noise = torch.randn_like(img)
+            step_noise = torch.randn_like(img) if noise is None else noise[step + 1].to(device)
 
             img = x_start * alpha_next.sqrt() + \
                   c * pred_noise + \
-                  sigma * noise
-            condition[2] = mix * alpha_next.sqrt() + \
+                  sigma * step_noise
+            mix_t = mix * alpha_next.sqrt() + \
                   c * pred_noise + \
-                  sigma * noise
+                  sigma * step_noise
+            condition[2] = mix_t if guidance_scale == 1. else torch.cat((mix_t, mix_t))
 
+            yield time_next, img
 
-            imgs.append(img)
+    @torch.no_grad()
+    def ddim_sample(self, condition, shape, return_all_timesteps = False, silence_mask_sampling = False, threshold = 2e-3, noise = None, callback = None, precompute_condition = False, guidance_scale = 1., t_start = 0.):
+        # callback(step, time_next, img) sees every intermediate image, e.g. to
+        # record a few of them, without the full return_all_timesteps history
+        imgs = []
+        for step, (time_next, img) in enumerate(self.ddim_sample_steps(
+                condition, shape, silence_mask_sampling = silence_mask_sampling, threshold = threshold, noise = noise,
+                precompute_condition = precompute_condition, guidance_scale = guidance_scale, t_start = t_start)):
+            if return_all_timesteps:
+                imgs.append(img)
+            if callback is not None:
+                callback(step, time_next, self.unnormalize(img))
 
         ret = img if not return_all_timesteps else torch.stack(imgs, dim = 1)
 
@@ -442,11 +518,7 @@ class GaussianDiffusion(nn.Module):
 
         # classifer free guidance
         if cfg:
-            mix, visual_feature = condition
-            idx = torch.where(torch.rand(b) < threshold)
-            mix[idx] = 0
-            visual_feature[idx] = 0
-            condition = [mix, visual_feature]
+            condition = cfg_dropout(condition, threshold)
 
         # predict and take gradient step
         condition.append(mix_t)
@@ -471,10 +543,11 @@ class GaussianDiffusion(nn.Module):
         loss = loss * extract(self.p2_loss_weight, t, loss.shape)
         return loss.mean()
 
-    def forward(self, img, condition, *args, **kwargs):
+    def forward(self, img, condition, *args, t_start = 0., **kwargs):
         b, c, h, w, device, img_size, = *img.shape, img.device, self.image_size
         assert h == img_size and w == img_size, f'height and width of image must be {img_size}'
-        t = torch.randint(0, self.num_timesteps, (b,), device=device).long()
+        # t_start > 0 trains only the steps a truncated-start sampler visits
+        t = torch.randint(0, self.start_timestep(t_start) + 1, (b,), device=device).long()
 
         img = self.normalize(img)
         return self.p_losses(img, t, condition, *args, **kwargs)
\ No newline at end of file
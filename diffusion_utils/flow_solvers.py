@@ -0,0 +1,145 @@
+import torch
+
+# ODE solvers for the flow-matching samplers (main_fm_muddy.py,
+# main_ave_fm.py). The velocity field is f(t, x) with a python float t in
+# [0, 1]; every call of f is one Unet forward, counted as one NFE.
+SOLVERS = ['euler', 'midpoint', 'heun', 'rk4', 'dopri5']
+
+
+class CountingField(object):
+    """Wraps a velocity field and counts its evaluations."""
+
+    def __init__(self, f):
+        self.f = f
+        self.nfe = 0
+
+    def __call__(self, t, x):
+        self.nfe += 1
+        return self.f(t, x)
+
+
+def euler_step(f, t, x, dt):
+    return x + dt * f(t, x)
+
+
+def midpoint_step(f, t, x, dt):
+    k1 = f(t, x)
+    return x + dt * f(t + dt / 2, x + dt / 2 * k1)
+
+
+def heun_step(f, t, x, dt):
+    k1 = f(t, x)
+    k2 = f(t + dt, x + dt * k1)
+    return x + dt / 2 * (k1 + k2)
+
+
+def rk4_step(f, t, x, dt):
+    k1 = f(t, x)
+    k2 = f(t + dt / 2, x + dt / 2 * k1)
+    k3 = f(t + dt / 2, x + dt / 2 * k2)
+    k4 = f(t + dt, x + dt * k3)
+    return x + dt / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+FIXED_STEPS = {
+    'euler': euler_step,
+    'midpoint': midpoint_step,
+    'heun': heun_step,
+    'rk4': rk4_step,
+}
+
+
+# offsets of the stages inside a step, in units of dt
+STAGES = {
+    'euler': [0.],
+    'midpoint': [0., 0.5],
+    'heun': [0., 1.],
+    'rk4': [0., 0.5, 0.5, 1.],
+}
+
+
+def stage_times(method, t0=0., t1=1., steps=2):
+    """Times at which a fixed-step solve evaluates f, None for dopri5."""
+    if method not in STAGES:
+        return None
+    ts = torch.linspace(t0, t1, steps + 1).tolist()
+    times = set()
+    for t, t_next in zip(ts[:-1], ts[1:]):
+        dt = t_next - t
+        times.update(t + c * dt for c in STAGES[method])
+    return sorted(times)
+
+
+def fixed_grid(f, x0, t0, t1, steps, step_fn):
+    ts = torch.linspace(t0, t1, steps + 1).tolist()
+    x = x0
+    for t, t_next in zip(ts[:-1], ts[1:]):
+        x = step_fn(f, t, x, t_next - t)
+    return x
+
+
+# Dormand-Prince 5(4) tableau
+_DOPRI_C = [0., 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1., 1.]
+_DOPRI_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+    [35 / 384, 0., 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84],
+]
+_DOPRI_B = [35 / 384, 0., 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0.]
+_DOPRI_B4 = [5179 / 57600, 0., 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40]
+
+
+def dopri5(f, x0, t0, t1, rtol=1e-3, atol=1e-3, first_step=None, max_steps=1000):
+    """Adaptive Dormand-Prince 5(4) with a shared step size for the batch.
+
+    The error of a step is the RMS over the whole batch of the 5th/4th order
+    difference scaled by atol + rtol * |x|. Accepted steps reuse the last
+    stage as the first stage of the next one (FSAL), so a step costs 6 NFE.
+    """
+    t, x = t0, x0
+    if t >= t1:
+        return x
+    h = first_step if first_step is not None else t1 - t0
+    k1 = f(t, x)
+    for _ in range(max_steps):
+        last = h >= t1 - t
+        if last:
+            h = t1 - t
+        ks = [k1]
+        for i in range(1, 7):
+            xi = x + h * sum(a * k for a, k in zip(_DOPRI_A[i], ks) if a != 0.)
+            ks.append(f(t + _DOPRI_C[i] * h, xi))
+        # the 7th stage is evaluated at the 5th order solution
+        x_new = xi
+        err = h * sum((b - b4) * k for b, b4, k in zip(_DOPRI_B, _DOPRI_B4, ks) if b != b4)
+        scale = atol + rtol * torch.maximum(x.abs(), x_new.abs())
+        err_norm = (err / scale).pow(2).mean().sqrt().item()
+        if err_norm <= 1.:
+            if last:
+                return x_new
+            t, x, k1 = t + h, x_new, ks[-1]
+        factor = 5. if err_norm == 0. else min(5., max(0.2, 0.9 * err_norm ** -0.2))
+        h = h * factor
+    raise RuntimeError('dopri5 did not reach t={} within {} steps'.format(t1, max_steps))
+
+
+def solve(f, x0, t0=0., t1=1., method='euler', steps=2, rtol=1e-3, atol=1e-3):
+    """Integrates dx/dt = f(t, x) from t0 to t1, returns (x(t1), NFE).
+
+    Fixed-step methods take `steps` uniform steps; dopri5 starts with a
+    step of (t1 - t0) / steps and adapts it to rtol/atol.
+    """
+    if not t0 < t1:
+        raise ValueError('solve needs t0 < t1, got t0={} t1={}'.format(t0, t1))
+    f = CountingField(f)
+    if method == 'dopri5':
+        x = dopri5(f, x0, t0, t1, rtol=rtol, atol=atol, first_step=(t1 - t0) / steps)
+    elif method in FIXED_STEPS:
+        x = fixed_grid(f, x0, t0, t1, steps, FIXED_STEPS[method])
+    else:
+        raise ValueError('unknown ODE solver {}, expected one of {}'.format(method, SOLVERS))
+    return x, f.nfe
@@ -17,7 +17,10 @@ from torch.utils.tensorboard import SummaryWriter
 # Our libs
 from arguments import ArgParser
 from dataset import MUSICMixDataset
-from modules import models
+from dataset.sample_list import VirtualEpochSampler
+from dataset.materialized import MaterializedDataset
+from dataset.batch_mix import BatchMixCollate
+from modules import models, stft
 from diffusion_utils import diffusion_pytorch
 from utils import AverageMeter, magnitude2heatmap, \
     istft_reconstruction, warpgrid, makedirs
@@ -44,6 +47,8 @@ class NetWrapper(torch.nn.Module):
         self.scale_factor = 0.15
 
     def forward(self, batch_data, args, t):
+        if args.gpu_stft:
+            stft.batch_spectrograms(batch_data, args, with_phase=False)
         mag_mix = batch_data['mag_mix']
         mags = batch_data['mags']
         frames = batch_data['frames']
@@ -86,11 +91,13 @@ class NetWrapper(torch.nn.Module):
             feat_frames[n] = self.net_frame.forward_multiframe(frames[n], pool=False)
 
         # Loss
-        loss_sep = 1e3*self.sampler(log_mag0, [log_mag_mix, feat_frames[0]], log=False, weight=weight) + 1e3*self.sampler(log_mag2, [log_mag_mix, feat_frames[1]], log=False, weight=weight) 
+        loss_sep = 1e3*self.sampler(log_mag0, [log_mag_mix, feat_frames[0]], log=False, weight=weight, t_start=args.train_t_start, cfg=args.cfg_dropout > 0, threshold=args.cfg_dropout) + 1e3*self.sampler(log_mag2, [log_mag_mix, feat_frames[1]], log=False, weight=weight, t_start=args.train_t_start, cfg=args.cfg_dropout > 0, threshold=args.cfg_dropout) 
 
         return loss_sep
 
-    def sample(self, batch_data, args):
+    def sample(self, batch_data, args, noise=None):
+        if args.gpu_stft:
+            stft.batch_spectrograms(batch_data, args, with_phase=True)
         mag_mix = batch_data['mag_mix']
         mags = batch_data['mags']
         frames = batch_data['frames']
@@ -120,26 +127,20 @@ class NetWrapper(torch.nn.Module):
         log_mag0 = log_mag0.detach()
         log_mag2 = log_mag2.detach()
 
-        # Frame feature (conditions)
-        feat_frames = [None for n in range(N)]
-        for n in range(N):
-            feat_frames[n] = self.net_frame.forward_multiframe(frames[n].to(args.device), pool=False)
-        
-        # ddim sampling
-        preds0 = self.sampler.ddim_sample(condition=[log_mag_mix, feat_frames[0]], shape=log_mag_mix.shape, return_all_timesteps = True, silence_mask_sampling=True)    
-        preds1 = self.sampler.ddim_sample(condition=[log_mag_mix, feat_frames[1]], shape=log_mag_mix.shape, return_all_timesteps = True,silence_mask_sampling=True)
+        # Frame feature (conditions), one pass over the B*N clips
+        feat_frames = self.net_frame.forward_multiframe(
+            torch.cat([frames[n] for n in range(N)]).to(args.device), pool=False)
 
-        pred0 = preds0[:, -1, ...]
-        pred1 = preds1[:, -1, ...]
+        if args.compile_schedule:
+            self.net.net_unet.compile_schedule([time for time, _ in self.sampler.ddim_time_pairs(args.sample_t_start)])
 
-        pred0 = pred0 / self.scale_factor
-        pred1 = pred1 / self.scale_factor
-        X0_pred = torch.exp(pred0.abs()) - 1
-        X1_pred = torch.exp(pred1.abs()) - 1
+        # ddim sampling, the N sources stacked along the batch so that each
+        # step is a single Unet forward
+        log_mag_mix = log_mag_mix.repeat(N, 1, 1, 1)
+        preds = self.sampler.ddim_sample(condition=[log_mag_mix, feat_frames], shape=log_mag_mix.shape, silence_mask_sampling=True, noise=noise, precompute_condition=args.precompute_condition, guidance_scale=args.guidance_scale, t_start=args.sample_t_start)
 
-        pred_mags = [None for n in range(2)]
-        pred_mags[0] = X0_pred  
-        pred_mags[1] = X1_pred 
+        preds = preds / self.scale_factor
+        pred_mags = [torch.exp(pred.abs()) - 1 for pred in preds.chunk(N)]
 
         return {'pred_mags': pred_mags, 'mag_mix': mag_mix, 'mags': mags}
 
@@ -172,23 +173,33 @@ def calc_metrics(batch_data, outputs, args):
                 warpgrid(B, args.stft_frame//2+1, mag_mix.size(3), warp=False)).to(args.device)
             pred_mags[n] = F.grid_sample(pred_mags[n], grid_unwarp, align_corners=True)
 
+    # batched ISTFT on the training device
+    if args.gpu_stft:
+        mix_wavs = stft.istft(mag_mix[:, 0], phase_mix[:, 0], args.stft_hop).cpu().numpy()
+        preds_wavs = [stft.istft(pred_mags[n][:, 0].detach(), phase_mix[:, 0], args.stft_hop).cpu().numpy()
+                      for n in range(N)]
+
     # convert into numpy
-    mag_mix = mag_mix.numpy()
-    phase_mix = phase_mix.numpy()
+    mag_mix = mag_mix.cpu().numpy()
+    phase_mix = phase_mix.cpu().numpy()
     for n in range(N):
         pred_mags[n] = pred_mags[n].detach().cpu().numpy()
 
     # loop over each sample
     for j in range(B):
-        # save mixture
-        mix_wav = istft_reconstruction(mag_mix[j, 0], phase_mix[j, 0], hop_length=args.stft_hop)
+        if args.gpu_stft:
+            mix_wav = mix_wavs[j]
+            preds_wav = [preds_wavs[n][j] for n in range(N)]
+        else:
+            # save mixture
+            mix_wav = istft_reconstruction(mag_mix[j, 0], phase_mix[j, 0], hop_length=args.stft_hop)
 
-        # save each component
-        preds_wav = [None for n in range(N)]
-        for n in range(N):
-            # Predicted audio recovery
-            pred_mag = pred_mags[n][j, 0]
-            preds_wav[n] = istft_reconstruction(pred_mag, phase_mix[j, 0], hop_length=args.stft_hop)
+            # save each component
+            preds_wav = [None for n in range(N)]
+            for n in range(N):
+                # Predicted audio recovery
+                pred_mag = pred_mags[n][j, 0]
+                preds_wav[n] = istft_reconstruction(pred_mag, phase_mix[j, 0], hop_length=args.stft_hop)
 
         # separation performance computes
         L = preds_wav[0].shape[0]
@@ -240,8 +251,8 @@ def output_visuals(batch_data, outputs, args):
             mags[n] = F.grid_sample(mags[n], grid_unwarp, align_corners=True)
 
     # convert into numpy
-    mag_mix = mag_mix.numpy()
-    phase_mix = phase_mix.numpy()
+    mag_mix = mag_mix.cpu().numpy()
+    phase_mix = phase_mix.cpu().numpy()
     for n in range(N):
         pred_mags[n] = pred_mags[n].detach().cpu().numpy()
 
@@ -356,6 +367,9 @@ def train(netWrapper, loader, optimizer, history, epoch, args, writer, running_l
     tic = time.perf_counter()
 
     for i, batch_data in enumerate(loader):
+        if batch_data is None:
+            # --batch_mix found no distinct-class pair in the batch
+            continue
         # measure data time
         torch.cuda.synchronize()
         data_time.update(time.perf_counter() - tic)
@@ -444,15 +458,25 @@ def main(args):
     # Dataset and Loader
     dataset_train = MUSICMixDataset(
         args.list_train, args, split='train')
-    dataset_val = MUSICMixDataset(
-        args.list_val, args, max_sample=args.num_val, split=args.split)
-
+    if args.eval_store:
+        # val/test items materialized by preprocessing/materialize_eval.py
+        dataset_val = MaterializedDataset(
+            args.eval_store, args, max_sample=args.num_val)
+    else:
+        dataset_val = MUSICMixDataset(
+            args.list_val, args, max_sample=args.num_val, split=args.split)
+
+    # dup_trainset virtual copies per epoch, reshuffled every epoch
+    sampler_train = VirtualEpochSampler(
+        len(dataset_train), args.dup_trainset, args.seed,
+        exclude=dataset_train.quarantined_indices if args.quarantine else None)
     loader_train = torch.utils.data.DataLoader(
         dataset_train,
         batch_size=args.batch_size,
-        shuffle=True,
+        sampler=sampler_train,
         num_workers=int(args.workers),
-        drop_last=True)
+        drop_last=True,
+        collate_fn=BatchMixCollate(args) if args.batch_mix else None)
     loader_val = torch.utils.data.DataLoader(
         dataset_val,
         batch_size=args.batch_size,
@@ -461,7 +485,7 @@ def main(args):
         num_workers=2,
         drop_last=False)
 
-    args.epoch_iters = len(dataset_train) // args.batch_size
+    args.epoch_iters = len(sampler_train) // args.batch_size
     print('1 Epoch = {} iters'.format(args.epoch_iters))
 
     writer = SummaryWriter(f'{args.ckpt}/runs')
@@ -491,6 +515,9 @@ def main(args):
     
     # Training loop
     for epoch in range(1, args.num_epoch + 1):
+        # picks up samples quarantined so far before the loader sizes the epoch
+        sampler_train.set_epoch(epoch)
+        args.epoch_iters = len(sampler_train) // args.batch_size
         train(netWrapper, loader_train, optimizer, history, epoch, args, writer, running_loss)
         writer.flush()
 
@@ -17,7 +17,11 @@ from torch.utils.tensorboard import SummaryWriter
 # Our libs
 from arguments import ArgParser
 from dataset import AVEMixDataset
-from modules import models
+from dataset.sample_list import VirtualEpochSampler
+from dataset.materialized import MaterializedDataset
+from dataset.batch_mix import BatchMixCollate
+from modules import models, stft
+from diffusion_utils import diffusion_pytorch, flow_solvers
 from utils import AverageMeter, magnitude2heatmap, \
     istft_reconstruction, warpgrid, makedirs
 import warnings
@@ -29,19 +33,21 @@ class NetWrapper(torch.nn.Module):
         super(NetWrapper, self).__init__()
         self.net_frame, self.net = nets
         self.scale_factor = 0.15
-        self.t_eps = 0.
         self.sigma_min = 1e-4
-        self.nfe_steps = 2
         loss_fn = "l1"
         if loss_fn == "l1":
             self.loss_fn = lambda a, b: torch.mean(torch.abs(a - b))
         elif loss_fn == "l2":
             self.loss_fn = lambda a, b: torch.mean((a - b) ** 2)
 
-    def _step(self, x, target, condition):
+    def _step(self, x, target, condition, t_start=0., cfg_dropout=0.):
         self.net.train()
+        if cfg_dropout > 0:
+            # unconditional branch for classifier-free guidance
+            condition = diffusion_pytorch.cfg_dropout(condition, cfg_dropout)
 
-        t = torch.rand([x.shape[0],1,1,1], device=x.device)* (1- self.t_eps) + self.t_eps
+        # t ~ U[t_start, 1], matching samplers started at --sample_t_start
+        t = torch.rand([x.shape[0],1,1,1], device=x.device)* (1- t_start) + t_start
         x1 = target
         x0 = torch.randn_like(target)
 
@@ -58,25 +64,34 @@ class NetWrapper(torch.nn.Module):
 
         return self.loss_fn(v, vec) + self.loss_fn(target, v+(1 - self.sigma_min) * x0)
 
-    def euler_solver(self, x0, condition):
+    def ode_solver(self, x0, condition, args):
+        # integrates the learned vector field from --sample_t_start to 1 with
+        # --fm_solver, returns the sample and the number of Unet calls
         self.net.eval()
-        ts = torch.linspace(self.t_eps, 1, self.nfe_steps+1)[1:]
-        t = self.t_eps 
-        x = x0
-
-        # mask = (condition[0] > 0.002).float()
-
-        for tau in ts:
-            dt = tau - t
-            t = torch.ones(x.shape[0], device=x.device) * t
-            dphi_dt = self.net(x, t*1000, condition)
-            x = x + dt * dphi_dt
-            # # silence_mask_guided_sampling
-            # x = mask * (x + dt * dphi_dt) + (1-mask) * (tau * condition[0] + (1 - (1 - self.sigma_min) * tau) * x0)
-            t = tau
-        return x
+        if args.compile_schedule:
+            times = flow_solvers.stage_times(args.fm_solver, args.sample_t_start, 1., args.nfe_steps)
+            if times is not None:
+                self.net.net_unet.compile_schedule(torch.tensor(times) * 1000)
+
+        if args.guidance_scale != 1.:
+            # conditional and unconditional branches as one batch
+            condition = diffusion_pytorch.cfg_condition(condition)
+        if args.precompute_condition:
+            condition = condition[:3] + [self.net.precompute_condition(condition)]
+
+        def velocity(t, x):
+            t = torch.full((x.shape[0],), t, device=x.device)
+            if args.guidance_scale != 1.:
+                return diffusion_pytorch.guided_output(self.net, x, t*1000, condition, args.guidance_scale)
+            return self.net(x, t*1000, condition)
+
+        return flow_solvers.solve(
+            velocity, x0, args.sample_t_start, 1., method=args.fm_solver, steps=args.nfe_steps,
+            rtol=args.fm_rtol, atol=args.fm_atol)
 
     def forward(self, batch_data, args, t):
+        if args.gpu_stft:
+            stft.batch_spectrograms(batch_data, args, with_phase=False)
         mag_mix = batch_data['mag_mix']
         mags = batch_data['mags']
         frames = batch_data['frames']
@@ -119,11 +134,13 @@ class NetWrapper(torch.nn.Module):
             feat_frames[n] = self.net_frame.forward_multiframe(frames[n], pool=False)
 
         # Loss
-        loss_sep = 1e3*self._step(log_mag_mix, log_mag0, [log_mag_mix, feat_frames[0], log_mag_mix]) + 1e3*self._step(log_mag_mix, log_mag2, [log_mag_mix, feat_frames[1], log_mag_mix]) 
+        loss_sep = 1e3*self._step(log_mag_mix, log_mag0, [log_mag_mix, feat_frames[0], log_mag_mix], args.train_t_start, args.cfg_dropout) + 1e3*self._step(log_mag_mix, log_mag2, [log_mag_mix, feat_frames[1], log_mag_mix], args.train_t_start, args.cfg_dropout) 
 
         return loss_sep
 
     def sample(self, batch_data, args):
+        if args.gpu_stft:
+            stft.batch_spectrograms(batch_data, args, with_phase=True)
         mag_mix = batch_data['mag_mix']
         mags = batch_data['mags']
         frames = batch_data['frames']
@@ -158,11 +175,14 @@ class NetWrapper(torch.nn.Module):
         for n in range(N):
             feat_frames[n] = self.net_frame.forward_multiframe(frames[n].to(args.device), pool=False)
         
-        # euler solver sampling
+        # ODE solver sampling
+        # truncated start: the path at t = sample_t_start with the mixture
+        # standing in for the source, pure noise when it is 0
+        t_start = args.sample_t_start
         x0 = torch.randn_like(log_mag_mix) 
-        x0 = self.t_eps * log_mag_mix + (1 - (1 - self.sigma_min) * self.t_eps) * x0
-        pred0 = self.euler_solver(x0, condition=[log_mag_mix, feat_frames[0], log_mag_mix])
-        pred1 = self.euler_solver(x0, condition=[log_mag_mix, feat_frames[1], log_mag_mix])
+        x0 = t_start * log_mag_mix + (1 - (1 - self.sigma_min) * t_start) * x0
+        pred0, nfe0 = self.ode_solver(x0, [log_mag_mix, feat_frames[0], log_mag_mix], args)
+        pred1, nfe1 = self.ode_solver(x0, [log_mag_mix, feat_frames[1], log_mag_mix], args)
 
         pred0 = pred0 / self.scale_factor
         pred1 = pred1 / self.scale_factor
@@ -173,7 +193,7 @@ class NetWrapper(torch.nn.Module):
         pred_mags[0] = X0_pred  
         pred_mags[1] = X1_pred 
 
-        return {'pred_mags': pred_mags, 'mag_mix': mag_mix, 'mags': mags}
+        return {'pred_mags': pred_mags, 'mag_mix': mag_mix, 'mags': mags, 'nfe': nfe0 + nfe1}
 
 
 SDR_pred = []
@@ -204,23 +224,33 @@ def calc_metrics(batch_data, outputs, args):
                 warpgrid(B, args.stft_frame//2+1, mag_mix.size(3), warp=False)).to(args.device)
             pred_mags[n] = F.grid_sample(pred_mags[n], grid_unwarp, align_corners=True)
 
+    # batched ISTFT on the training device
+    if args.gpu_stft:
+        mix_wavs = stft.istft(mag_mix[:, 0], phase_mix[:, 0], args.stft_hop).cpu().numpy()
+        preds_wavs = [stft.istft(pred_mags[n][:, 0].detach(), phase_mix[:, 0], args.stft_hop).cpu().numpy()
+                      for n in range(N)]
+
     # convert into numpy
-    mag_mix = mag_mix.numpy()
-    phase_mix = phase_mix.numpy()
+    mag_mix = mag_mix.cpu().numpy()
+    phase_mix = phase_mix.cpu().numpy()
     for n in range(N):
         pred_mags[n] = pred_mags[n].detach().cpu().numpy()
 
     # loop over each sample
     for j in range(B):
-        # save mixture
-        mix_wav = istft_reconstruction(mag_mix[j, 0], phase_mix[j, 0], hop_length=args.stft_hop)
+        if args.gpu_stft:
+            mix_wav = mix_wavs[j]
+            preds_wav = [preds_wavs[n][j] for n in range(N)]
+        else:
+            # save mixture
+            mix_wav = istft_reconstruction(mag_mix[j, 0], phase_mix[j, 0], hop_length=args.stft_hop)
 
-        # save each component
-        preds_wav = [None for n in range(N)]
-        for n in range(N):
-            # Predicted audio recovery
-            pred_mag = pred_mags[n][j, 0]
-            preds_wav[n] = istft_reconstruction(pred_mag, phase_mix[j, 0], hop_length=args.stft_hop)
+            # save each component
+            preds_wav = [None for n in range(N)]
+            for n in range(N):
+                # Predicted audio recovery
+                pred_mag = pred_mags[n][j, 0]
+                preds_wav[n] = istft_reconstruction(pred_mag, phase_mix[j, 0], hop_length=args.stft_hop)
 
         # separation performance computes
         L = preds_wav[0].shape[0]
@@ -272,8 +302,8 @@ def output_visuals(batch_data, outputs, args):
             mags[n] = F.grid_sample(mags[n], grid_unwarp, align_corners=True)
 
     # convert into numpy
-    mag_mix = mag_mix.numpy()
-    phase_mix = phase_mix.numpy()
+    mag_mix = mag_mix.cpu().numpy()
+    phase_mix = phase_mix.cpu().numpy()
     for n in range(N):
         pred_mags[n] = pred_mags[n].detach().cpu().numpy()
 
@@ -388,6 +418,9 @@ def train(netWrapper, loader, optimizer, history, epoch, args, writer, running_l
     tic = time.perf_counter()
 
     for i, batch_data in enumerate(loader):
+        if batch_data is None:
+            # --batch_mix found no distinct-class pair in the batch
+            continue
         # measure data time
         torch.cuda.synchronize()
         data_time.update(time.perf_counter() - tic)
@@ -476,15 +509,25 @@ def main(args):
     # Dataset and Loader
     dataset_train = AVEMixDataset(
         args.list_train, args, split='train')
-    dataset_val = AVEMixDataset(
-        args.list_val, args, max_sample=args.num_val, split=args.split)
-
+    if args.eval_store:
+        # val/test items materialized by preprocessing/materialize_eval.py
+        dataset_val = MaterializedDataset(
+            args.eval_store, args, max_sample=args.num_val)
+    else:
+        dataset_val = AVEMixDataset(
+            args.list_val, args, max_sample=args.num_val, split=args.split)
+
+    # dup_trainset virtual copies per epoch, reshuffled every epoch
+    sampler_train = VirtualEpochSampler(
+        len(dataset_train), args.dup_trainset, args.seed,
+        exclude=dataset_train.quarantined_indices if args.quarantine else None)
     loader_train = torch.utils.data.DataLoader(
         dataset_train,
         batch_size=args.batch_size,
-        shuffle=True,
+        sampler=sampler_train,
         num_workers=int(args.workers),
-        drop_last=True)
+        drop_last=True,
+        collate_fn=BatchMixCollate(args) if args.batch_mix else None)
     loader_val = torch.utils.data.DataLoader(
         dataset_val,
         batch_size=args.batch_size,
@@ -493,7 +536,7 @@ def main(args):
         num_workers=2,
         drop_last=False)
 
-    args.epoch_iters = len(dataset_train) // args.batch_size
+    args.epoch_iters = len(sampler_train) // args.batch_size
     print('1 Epoch = {} iters'.format(args.epoch_iters))
 
     writer = SummaryWriter(f'{args.ckpt}/runs')
@@ -523,6 +566,9 @@ def main(args):
     
     # Training loop
     for epoch in range(1, args.num_epoch + 1):
+        # picks up samples quarantined so far before the loader sizes the epoch
+        sampler_train.set_epoch(epoch)
+        args.epoch_iters = len(sampler_train) // args.batch_size
         train(netWrapper, loader_train, optimizer, history, epoch, args, writer, running_loss)
         writer.flush()
 
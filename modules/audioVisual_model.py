@@ -30,11 +30,17 @@ class AudioVisualModel(torch.nn.Module):
             nn.Linear(time_dim, time_dim)
         )
 
+    def precompute_condition(self, condition):
+        # optional 4th condition element, reused by every sampling step
+        mix, visual_feature = condition[:2]
+        return self.net_unet.precompute_condition(mix, visual_feature)
+
     def forward(self, x, t, condition):
         # 2D U-Net
-        mix, visual_feature, mix_t = condition
+        mix, visual_feature, mix_t = condition[:3]
+        cond_cache = condition[3] if len(condition) > 3 else None
 
         # predict spectrogram
-        spec_prediction = self.net_unet(x, t, x_self_cond=mix, mix_t=mix_t, visual_feat = visual_feature)
+        spec_prediction = self.net_unet(x, t, x_self_cond=mix, mix_t=mix_t, visual_feat = visual_feature, cond_cache = cond_cache)
 
         return spec_prediction
\ No newline at end of file
@@ -26,6 +26,11 @@ def weights_init(m):
     elif classname.find('Linear') != -1:
         m.weight.data.normal_(0.0, 0.02)
 
+def consumed_frames(arch_frame):
+    # frames of a (B, C, T, H, W) clip that forward_multiframe uses: the
+    # ResNet path keeps only the first one, CLIP attends over all of them
+    return slice(0, 1) if arch_frame == 'resnet18' else slice(None)
+
 class Resnet(nn.Module):
     def __init__(self, original_resnet,pool_type='maxpool', use_transformer=False):
         super(Resnet, self).__init__()
@@ -54,18 +59,25 @@ class Resnet(nn.Module):
         return x
 
     def forward_multiframe(self, x, pool=True):
-        (B, C, T, H, W) = x.size()
-        x = x.permute(0, 2, 1, 3, 4).contiguous()
-        x = x.view(B * T, C, H, W)
-
-        x = self.features(x)
-
-        (_, C, H, W) = x.size()
-        x = x.view(B, T, C, H, W)
-        x = x[:, 0:1, ...]
-        x = x.permute(0, 2, 1, 3, 4)
-
-        x = torch.mean(x, dim=(3,4))
+        if x.dim() == 3:
+            # precomputed (B, T, C) backbone features
+            x = x[:, consumed_frames('resnet18'), :]
+            (B, T, C) = x.size()
+            x = x.transpose(1, 2)
+        else:
+            # only the consumed frames go through the trunk
+            x = x[:, :, consumed_frames('resnet18')]
+            (B, C, T, H, W) = x.size()
+            x = x.permute(0, 2, 1, 3, 4).contiguous()
+            x = x.view(B * T, C, H, W)
+
+            x = self.features(x)
+
+            (_, C, H, W) = x.size()
+            x = x.view(B, T, C, H, W)
+            x = x.permute(0, 2, 1, 3, 4)
+
+            x = torch.mean(x, dim=(3,4))
 
         # transformer
         if self.use_transformer:
@@ -107,14 +119,18 @@ class Clip(nn.Module):
         return x
         
     def forward_multiframe(self, x, pool=True):
-        (B, C, T, H, W) = x.size()
-        x = x.permute(0, 2, 1, 3, 4).contiguous()
-        x = x.view(B * T, C, H, W)
-
-        x = self.model.encode_image(x)
-
-        (_, C) = x.size()
-        x = x.view(B, T, C).transpose(1,2)
+        if x.dim() == 3:
+            # precomputed (B, T, C) image embeddings
+            x = x.transpose(1,2)
+        else:
+            (B, C, T, H, W) = x.size()
+            x = x.permute(0, 2, 1, 3, 4).contiguous()
+            x = x.view(B * T, C, H, W)
+
+            x = self.model.encode_image(x)
+
+            (_, C) = x.size()
+            x = x.view(B, T, C).transpose(1,2)
 
         # transformer
         # x = self.temporal_transformer(x.transpose(1,2)).transpose(1,2)
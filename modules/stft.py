@@ -0,0 +1,64 @@
+import torch
+
+# Batched torch counterparts of BaseDataset._stft (librosa.stft) and
+# utils.istft_reconstruction (librosa.istft), used with --gpu_stft. Both use
+# librosa 0.9's defaults: periodic hann window, centered frames and zero
+# (constant) padding, so the outputs match the dataset spectrograms, edge
+# frames included.
+_windows = {}
+
+
+def _hann(n_fft, device):
+    key = (n_fft, str(device))
+    if key not in _windows:
+        _windows[key] = torch.hann_window(n_fft, device=device)
+    return _windows[key]
+
+
+def stft(audio, n_fft=1022, hop_length=256):
+    # audio: (..., L) -> complex (..., n_fft // 2 + 1, 1 + L // hop_length)
+    shape = audio.shape[:-1]
+    spec = torch.stft(
+        audio.reshape(-1, audio.size(-1)).float(), n_fft, hop_length=hop_length,
+        window=_hann(n_fft, audio.device), center=True, pad_mode='constant',
+        return_complex=True)
+    return spec.reshape(*shape, *spec.shape[-2:])
+
+
+def istft(mag, phase, hop_length=256):
+    # mag, phase: (..., F, T) -> (..., hop_length * (T - 1)), clipped to [-1, 1]
+    shape = mag.shape[:-2]
+    n_fft = 2 * (mag.size(-2) - 1)
+    spec = torch.polar(mag.float(), phase.float()).reshape(-1, *mag.shape[-2:])
+    wav = torch.istft(
+        spec, n_fft, hop_length=hop_length, window=_hann(n_fft, mag.device),
+        center=True)
+    return wav.reshape(*shape, wav.size(-1)).clamp(-1., 1.)
+
+
+def batch_spectrograms(batch_data, args, with_phase=True, device=None):
+    """Fills mag_mix, mags and (with_phase) phase_mix of a waveform-only batch.
+
+    MUSIC/AVE batches carry a list of N source waveforms whose mean is the
+    mixture, so the mixture spectrum is the mean of the source spectra and
+    only the N sources are transformed. Muddy batches carry the recorded
+    mixture and one separated source, both of which are transformed.
+    """
+    audios = batch_data['audios']
+    if device is None:
+        # under DataParallel the batch is already scattered onto the replica
+        device = batch_data['audio_mix'].device
+        if device.type == 'cpu':
+            device = args.device
+    if isinstance(audios, (list, tuple)):
+        specs = stft(torch.stack(audios).to(device), args.stft_frame, args.stft_hop)
+        spec_mix = specs.mean(0)
+        batch_data['mags'] = [spec.abs().unsqueeze(1) for spec in specs]
+    else:
+        spec_mix = stft(batch_data['audio_mix'].to(device), args.stft_frame, args.stft_hop)
+        batch_data['mags'] = stft(
+            audios.to(device), args.stft_frame, args.stft_hop).abs().unsqueeze(1)
+    batch_data['mag_mix'] = spec_mix.abs().unsqueeze(1)
+    if with_phase:
+        batch_data['phase_mix'] = spec_mix.angle().unsqueeze(1)
+    return batch_data
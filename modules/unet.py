@@ -74,6 +74,27 @@ def Downsample(dim, dim_out = None):
         nn.Conv2d(dim * 4, default(dim_out, dim), 1)
     )
 
+# time-conditioning schedules, see Unet.compile_schedule
+
+class ScheduleStep(object):
+    """Stands in for the time embedding at one step of a compiled schedule.
+
+    Passed down the Unet in place of the embedding; every time-conditioned
+    block looks its mlp output up instead of computing it.
+    """
+    def __init__(self, table, index, batch):
+        self.table = table
+        self.index = index
+        self.batch = batch
+
+    def lookup(self, mlp):
+        return self.table[mlp][self.index].unsqueeze(0).expand(self.batch, -1)
+
+def time_mlp_out(mlp, time_emb):
+    if isinstance(time_emb, ScheduleStep):
+        return time_emb.lookup(mlp)
+    return mlp(time_emb)
+
 def modulate(x, shift, scale):
     return x * (1 + scale.unsqueeze(1)) + shift.unsqueeze(1)
 
@@ -82,16 +103,30 @@ class WeightStandardizedConv2d(nn.Conv2d):
     https://arxiv.org/abs/1903.10520
     weight standardization purportedly works synergistically with group normalization
     """
-    def forward(self, x):
-        eps = 1e-5 if x.dtype == torch.float32 else 1e-3
+    def standardized_weight(self, dtype):
+        eps = 1e-5 if dtype == torch.float32 else 1e-3
 
         weight = self.weight
         mean = reduce(weight, 'o ... -> o 1 1 1', 'mean')
         var = reduce(weight, 'o ... -> o 1 1 1', partial(torch.var, unbiased = False))
-        normalized_weight = (weight - mean) * (var + eps).rsqrt()
+        return (weight - mean) * (var + eps).rsqrt()
 
+    def forward(self, x):
+        normalized_weight = self.standardized_weight(x.dtype)
         return F.conv2d(x, normalized_weight, self.bias, self.stride, self.padding, self.dilation, self.groups)
 
+    # the convolution is linear in its input, so for an input cat((cond, x))
+    # the cond channels can be convolved once and their output reused
+
+    def forward_leading(self, cond):
+        # output of the leading cond channels, bias included
+        weight = self.standardized_weight(cond.dtype)[:, :cond.shape[1]]
+        return F.conv2d(cond, weight, self.bias, self.stride, self.padding, self.dilation, self.groups)
+
+    def forward_trailing(self, x, leading):
+        weight = self.standardized_weight(x.dtype)[:, -x.shape[1]:]
+        return F.conv2d(x, weight, None, self.stride, self.padding, self.dilation, self.groups) + leading
+
 class RMSNorm(nn.Module):
     def __init__(self, dim):
         super().__init__()
@@ -186,8 +221,9 @@ class Block(nn.Module):
         self.norm = nn.GroupNorm(groups, dim_out)
         self.act = nn.SiLU()
 
-    def forward(self, x, scale_shift = None):
-        x = self.proj(x)
+    def forward(self, x, scale_shift = None, cond = None):
+        # cond: forward_leading output of the channels x is missing
+        x = self.proj(x) if cond is None else self.proj.forward_trailing(x, cond)
         x = self.norm(x)
 
         if exists(scale_shift):
@@ -209,18 +245,27 @@ class ResnetBlock(nn.Module):
         self.block2 = Block(dim_out, dim_out, groups = groups)
         self.res_conv = nn.Conv2d(dim, dim_out, 1) if dim != dim_out else nn.Identity()
 
-    def forward(self, x, time_emb = None):
+    def precompute(self, cond):
+        """Condition-only terms for inputs cat((cond, x)), see forward(cond=...)."""
+        res_conv = self.res_conv
+        res = F.conv2d(cond, res_conv.weight[:, :cond.shape[1]], res_conv.bias)
+        return self.block1.proj.forward_leading(cond), res
+
+    def forward(self, x, time_emb = None, cond = None):
+        # cond: precompute() output, x then holds only the non-condition channels
 
         scale_shift = None
         if exists(self.mlp) and exists(time_emb):
-            time_emb = self.mlp(time_emb)
+            time_emb = time_mlp_out(self.mlp, time_emb)
             time_emb = rearrange(time_emb, 'b c -> b c 1 1')
             scale_shift = time_emb.chunk(2, dim = 1)
 
-        h = self.block1(x, scale_shift = scale_shift)
+        h = self.block1(x, scale_shift = scale_shift, cond = None if cond is None else cond[0])
 
         h = self.block2(h)
 
+        if cond is not None:
+            return h + F.conv2d(x, self.res_conv.weight[:, -x.shape[1]:]) + cond[1]
         return h + self.res_conv(x)
 
 class LinearAttention(nn.Module):
@@ -242,7 +287,7 @@ class LinearAttention(nn.Module):
 
     def forward(self, x, time_emb = None, f_attn=False, t_attn=False):
         if exists(self.mlp) and exists(time_emb):
-            time_emb = self.mlp(time_emb)
+            time_emb = time_mlp_out(self.mlp, time_emb)
             time_emb = rearrange(time_emb, 'b c -> b c 1 1')
             scale_shift = time_emb.chunk(2, dim = 1)
             scale, shift = scale_shift
@@ -299,7 +344,7 @@ class Attention(nn.Module):
 
     def forward(self, x, time_emb = None):
         if exists(self.mlp) and exists(time_emb):
-            time_emb = self.mlp(time_emb)
+            time_emb = time_mlp_out(self.mlp, time_emb)
             time_emb = rearrange(time_emb, 'b c -> b c 1 1')
             scale_shift = time_emb.chunk(2, dim = 1)
             scale, shift = scale_shift
@@ -396,7 +441,7 @@ class TimeAttention(nn.Module):
             out: [B, C, T, Q]
         """
         if exists(self.mlp) and exists(time_emb):
-            time_emb = self.mlp(time_emb)
+            time_emb = time_mlp_out(self.mlp, time_emb)
             time_emb = rearrange(time_emb, 'b c -> b c 1 1')
             scale_shift = time_emb.chunk(2, dim = 1)
             scale, shift = scale_shift
@@ -497,6 +542,8 @@ class Unet(nn.Module):
 
         dims = [init_dim, *map(lambda m: dim * m, dim_mults)]
         in_out = list(zip(dims[:-1], dims[1:]))
+        # every level but the last halves the spectrogram
+        self.num_downsamples = len(in_out) - 1
 
         block_klass = partial(ResnetBlock, groups = resnet_block_groups)
 
@@ -569,15 +616,75 @@ class Unet(nn.Module):
         self.num_params = sum(p.numel() for p in self.parameters() if p.requires_grad)
         print(f"number of trainable parameters: {self.num_params}")
 
-    def forward(self, x, time, x_self_cond = None, mix_t = None, visual_feat = None):
-        if self.self_condition:
-            x_self_cond = default(x_self_cond, lambda: torch.zeros_like(x))
-            x = torch.cat((x_self_cond, x), dim = 1)
+        self.schedule = None
 
-        x = self.init_conv(x)
-        t = self.time_mlp(time)
+    def train(self, mode = True):
+        # a compiled schedule is only valid for the weights it was built with
+        if mode:
+            self.schedule = None
+        return super().train(mode)
+
+    @torch.no_grad()
+    def compile_schedule(self, times):
+        """Precomputes the time embedding and every block's scale/shift for `times`.
+
+        forward() then looks them up when all items of a batch share a time
+        of the schedule, and computes them as before otherwise. Compiling the
+        same times again is a no-op; train() clears the schedule since the
+        weights are about to change.
+        """
+        device = self.init_conv.weight.device
+        times = torch.as_tensor(times, dtype = torch.float, device = device).unique()
+        key = tuple(times.tolist())
+        if exists(self.schedule) and self.schedule['times'] == key:
+            return
+        emb = self.time_mlp(times)
+        mlps = [m.mlp for m in self.modules() if exists(getattr(m, 'mlp', None))]
+        self.schedule = {
+            'times': key,
+            'index': {time: i for i, time in enumerate(key)},
+            'table': {mlp: mlp(emb) for mlp in mlps},
+        }
+
+    def precompute_condition(self, x_self_cond, visual_feat):
+        """Work of forward() that only depends on the condition, for reuse across solver steps.
+
+        Returns the x_self_cond half of init_conv and the visual half of
+        mid_block1 (its conv and res_conv over the repeated visual feature);
+        pass it as forward(cond_cache=...).
+        """
+        init = None
+        if self.self_condition:
+            init = F.conv2d(x_self_cond, self.init_conv.weight[:, :self.channels], self.init_conv.bias)
+
+        h = x_self_cond.shape[2] // 2 ** self.num_downsamples
+        w = x_self_cond.shape[3] // 2 ** self.num_downsamples
+        visual_feat_cat = torch.mean(visual_feat.transpose(1,2), dim=1)
+        visual_feat_cat = visual_feat_cat.unsqueeze(-1).unsqueeze(-1).repeat(1, 1, h, w)
+        return {'init': init, 'mid': self.mid_block1.precompute(visual_feat_cat)}
+
+    def schedule_step(self, time):
+        if self.schedule is None or time.dim() != 1:
+            return None
+        lo, hi = torch.stack(time.aminmax()).float().tolist()
+        index = self.schedule['index'].get(lo)
+        if lo != hi or index is None:
+            return None
+        return ScheduleStep(self.schedule['table'], index, time.shape[0])
+
+    def forward(self, x, time, x_self_cond = None, mix_t = None, visual_feat = None, cond_cache = None):
+        if exists(cond_cache) and exists(cond_cache['init']):
+            x = F.conv2d(x, self.init_conv.weight[:, self.channels:]) + cond_cache['init']
+        else:
+            if self.self_condition:
+                x_self_cond = default(x_self_cond, lambda: torch.zeros_like(x))
+                x = torch.cat((x_self_cond, x), dim = 1)
+
+            x = self.init_conv(x)
+        c = self.schedule_step(time)
+        if c is None:
+            c = self.time_mlp(time)
         v = torch.mean(visual_feat, dim=2)
-        c = t
 
         r = x.clone()
         
@@ -594,14 +701,17 @@ class Unet(nn.Module):
 
             x = downsample(x)
 
-        visual_feat = visual_feat.transpose(1,2)
-        visual_feat_cat = torch.mean(visual_feat, dim=1)
-        visual_feat_cat = visual_feat_cat.unsqueeze(-1).unsqueeze(-1).repeat(1, 1, x.shape[2], x.shape[3])
+        if exists(cond_cache):
+            x = self.mid_block1(x, None, cond = cond_cache['mid'])
+        else:
+            visual_feat = visual_feat.transpose(1,2)
+            visual_feat_cat = torch.mean(visual_feat, dim=1)
+            visual_feat_cat = visual_feat_cat.unsqueeze(-1).unsqueeze(-1).repeat(1, 1, x.shape[2], x.shape[3])
 
-        x_in = x
-        
-        x = torch.cat([visual_feat_cat,x_in], dim=1)
-        x = self.mid_block1(x, None)
+            x_in = x
+
+            x = torch.cat([visual_feat_cat,x_in], dim=1)
+            x = self.mid_block1(x, None)
         x = self.mid_attn(x, time_emb=None)
         x = self.mid_block2(x, None)
 
@@ -0,0 +1,54 @@
+import os
+import sys
+import argparse
+import librosa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.array_store import ArrayStoreWriter
+
+
+def find_audio_files(root, exts):
+    files = []
+    for dirpath, _, filenames in os.walk(root):
+        for f in filenames:
+            if os.path.splitext(f)[1].lower() in exts:
+                files.append(os.path.join(dirpath, f))
+    return sorted(files)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--audio_root', nargs='+', required=True,
+                        help='directories to scan; keys are stored as the normalized <audio_root>/<relative path>, '
+                             'so pass the same (relative or absolute) root the dataset joins its paths with')
+    parser.add_argument('--out', required=True,
+                        help='output prefix, writes <out>.bin and <out>.json')
+    parser.add_argument('--audRate', default=11025, type=int,
+                        help='sound sampling rate, must match the training --audRate')
+    parser.add_argument('--dtype', default='float16', choices=['float16', 'float32'])
+    parser.add_argument('--exts', nargs='+', default=['.wav', '.mp3', '.flac'])
+    args = parser.parse_args()
+
+    paths = []
+    for root in args.audio_root:
+        paths += find_audio_files(root, set(args.exts))
+    print('# audio files: {}'.format(len(paths)))
+
+    num_samples = 0
+    with ArrayStoreWriter(args.out, args.dtype, meta={'rate': args.audRate}) as writer:
+        for i, path in enumerate(paths):
+            try:
+                audio_raw, rate = librosa.load(path, sr=None, mono=True)
+            except Exception as e:
+                print('Failed loading audio {}: {}'.format(path, e))
+                continue
+            # same rule as BaseDataset._load_audio: only downsample
+            if rate > args.audRate:
+                audio_raw = librosa.resample(audio_raw, orig_sr=rate, target_sr=args.audRate)
+            writer.add(os.path.normpath(path), audio_raw)
+            num_samples += audio_raw.shape[0]
+            if i % 500 == 0:
+                print('[{}/{}] {}'.format(i, len(paths), path))
+
+    print('wrote {} samples ({:.1f} h) to {}.bin'.format(
+        num_samples, num_samples / args.audRate / 3600., args.out))
@@ -0,0 +1,52 @@
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.array_store import ArrayStoreWriter
+
+
+# Turns the per-video detection results (rows of frame id, _, score, x1, y1,
+# x2, y2) into one dense table per video: row f holds the highest-scoring box
+# of frame id f (first one on ties, like best_box) or NaNs. Train with
+# --frames_det 1 --det_index <out>.
+#
+# python preprocessing/build_det_index.py --det_root /YOUR_ROOT/MUSIC/detection_results --out cache/det_index
+def dense_boxes(det_res):
+    ids = det_res[:, 0].astype(np.int64)
+    table = np.full((ids.max() + 1 if len(ids) else 0, 4), np.nan)
+    # by id, then by descending score, keeping the file order on ties
+    order = np.lexsort((-det_res[:, 2], ids))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = ids[order][1:] != ids[order][:-1]
+    best = order[first]
+    table[ids[best]] = det_res[best, 3:7]
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--det_root', nargs='+', required=True,
+                        help='directories to scan for detection .npy files, use the '
+                             'same root the dataset joins path_frames_det with')
+    parser.add_argument('--out', required=True,
+                        help='output prefix, writes <out>.bin and <out>.json')
+    args = parser.parse_args()
+
+    paths = []
+    for root in args.det_root:
+        for dirpath, _, filenames in os.walk(root):
+            paths += [os.path.join(dirpath, f) for f in filenames if f.endswith('.npy')]
+    paths.sort()
+    print('# detection files: {}'.format(len(paths)))
+
+    with ArrayStoreWriter(args.out, 'float64', shape=(4,), meta={'box': 'x1,y1,x2,y2'}) as writer:
+        for i, path in enumerate(paths):
+            det_res = np.load(path)
+            if det_res.ndim != 2 or det_res.shape[1] < 7:
+                print('Skipping {}: shape {}'.format(path, det_res.shape))
+                continue
+            writer.add(os.path.normpath(path), dense_boxes(det_res))
+            if i % 500 == 0:
+                print('[{}/{}] {}'.format(i, len(paths), path))
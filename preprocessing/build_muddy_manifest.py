@@ -0,0 +1,71 @@
+import os
+import sys
+import csv
+import argparse
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.muddy_mix import MuddyMixDataset
+
+
+# Extends the valid_muddy_mix_audios_*.csv lists with everything
+# MuddyMixDataset otherwise recomputes per item: the frame count, the
+# selected center frames for --num_frames, and the sample rate and length of
+# both audio files. Train with the written csv as --list_train/--list_val.
+#
+# python preprocessing/build_muddy_manifest.py --root /home/prj/data/Muddy_Mix \
+#     --csv valid_muddy_mix_audios_train.csv valid_muddy_mix_audios_val.csv --num_frames 3
+MANIFEST_FIELDS = ['Frame_Count', 'Num_Frames', 'Selected_Frames',
+                   'Raw_Audio_Rate', 'Raw_Audio_Samples', 'Speech_Rate', 'Speech_Samples']
+
+
+def describe(root, row, num_frames):
+    video_path = os.path.join(root, row['Video_Name'], 'sub_video', row['SubVideo_Name'])
+    frame_files = sorted(os.listdir(os.path.join(video_path, 'frames')))
+    raw = sf.info(os.path.join(video_path, 'audio_raw', row['SubVideo_Name'] + '.wav'))
+    speech = sf.info(os.path.join(video_path, 'separated', 'speech.wav'))
+    return {
+        'Frame_Count': len(frame_files),
+        'Num_Frames': num_frames,
+        'Selected_Frames': '|'.join(MuddyMixDataset.select_center_frames(frame_files, num_frames)),
+        'Raw_Audio_Rate': raw.samplerate,
+        'Raw_Audio_Samples': raw.frames,
+        'Speech_Rate': speech.samplerate,
+        'Speech_Samples': speech.frames,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default='/home/prj/data/Muddy_Mix')
+    parser.add_argument('--csv', nargs='+', required=True)
+    parser.add_argument('--num_frames', default=3, type=int,
+                        help='must match the training --num_frames, otherwise the '
+                             'dataset falls back to listing the frames')
+    parser.add_argument('--suffix', default='_manifest',
+                        help='written next to each input as <name><suffix>.csv')
+    args = parser.parse_args()
+
+    for path in args.csv:
+        with open(path, 'r') as f:
+            reader = csv.DictReader(f)
+            fields = [c for c in reader.fieldnames if c not in MANIFEST_FIELDS]
+            rows = list(reader)
+
+        out_rows = []
+        for i, row in enumerate(rows):
+            try:
+                row.update(describe(args.root, row, args.num_frames))
+            except Exception as e:
+                print('Dropping {}/{}: {}'.format(row['Video_Name'], row['SubVideo_Name'], e))
+                continue
+            out_rows.append(row)
+            if i % 1000 == 0:
+                print('[{}/{}] {}'.format(i, len(rows), path))
+
+        out_path = os.path.splitext(path)[0] + args.suffix + '.csv'
+        with open(out_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields + MANIFEST_FIELDS)
+            writer.writeheader()
+            writer.writerows(out_rows)
+        print('wrote {} of {} rows to {}'.format(len(out_rows), len(rows), out_path))
@@ -0,0 +1,75 @@
+import os
+import sys
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset.base import BaseDataset
+from dataset.array_store import ArrayStoreWriter
+from modules import models
+
+
+# Runs the frozen image backbone of net_frame once over every frame and stores
+# the per-frame outputs (512-d for both CLIP ViT-B/32 and the pooled ResNet-18
+# trunk), keyed by frame directory. Frames go through the val transform, so
+# training on the store drops the random crop/flip augmentation.
+#
+# python preprocessing/extract_frame_features.py --arch_frame clip \
+#     --frame_root /home/prj/data/Muddy_Mix --out cache/clip_feats
+def find_frame_dirs(root):
+    frame_dirs = []
+    for dirpath, _, filenames in os.walk(root):
+        names = sorted(f for f in filenames if f.lower().endswith('.jpg'))
+        if names:
+            frame_dirs.append((os.path.normpath(dirpath), names))
+    return sorted(frame_dirs)
+
+
+def encode(net, x, arch_frame):
+    if arch_frame == 'clip':
+        return net.model.encode_image(x)
+    return net.features(x).flatten(1)
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    parser.parser.add_argument('--frame_root', nargs='+', required=True,
+                               help='directories to scan for frame folders, use the '
+                                    'same roots the datasets join their frame paths with')
+    parser.parser.add_argument('--out', required=True,
+                               help='output prefix, writes <out>.bin and <out>.json')
+    parser.parser.add_argument('--dtype', default='float16', choices=['float16', 'float32'])
+    args = parser.parser.parse_args()
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    builder = models.ModelBuilder()
+    net = builder.build_visual(
+        pool_type=args.img_pool,
+        weights=args.weights_frame,
+        arch_frame=args.arch_frame)
+    net.to(device).eval()
+
+    # decode pixels with the val transform
+    args.frame_features = ''
+    dataset = BaseDataset([], args, split='val')
+    load = dataset._load_frames_clip if args.arch_frame == 'clip' else dataset._load_frames
+
+    frame_dirs = []
+    for root in args.frame_root:
+        frame_dirs += find_frame_dirs(root)
+    print('# frame folders: {}'.format(len(frame_dirs)))
+
+    bs = args.batch_size_per_gpu
+    meta = {'arch': args.arch_frame, 'imgSize': args.imgSize}
+    with ArrayStoreWriter(args.out, args.dtype, shape=(512,), meta=meta) as writer, \
+            torch.no_grad():
+        for i, (frame_dir, names) in enumerate(frame_dirs):
+            feats = []
+            for j in range(0, len(names), bs):
+                frames = load([os.path.join(frame_dir, n) for n in names[j:j + bs]])
+                x = frames.transpose(0, 1).to(device)  # (C, T, H, W) -> (T, C, H, W)
+                feats.append(encode(net, x, args.arch_frame).float().cpu().numpy())
+            writer.add(frame_dir, np.concatenate(feats), names=names)
+            if i % 100 == 0:
+                print('[{}/{}] {}'.format(i, len(frame_dirs), frame_dir))
@@ -0,0 +1,56 @@
+import os
+import sys
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from arguments import ArgParser
+from dataset import MUSICMixDataset, AVEMixDataset, MuddyMixDataset
+from dataset.materialized import MaterializedWriter
+
+
+# Runs the deterministic val/test dataset once and writes every item (mixed
+# and per-source waveforms, magnitudes, phase, frames or frame embeddings,
+# infos) to a memory-mapped eval store. Train with --eval_store <out> using
+# the same data/STFT/frame options.
+#
+# python preprocessing/materialize_eval.py --dataset muddy --list_val valid_muddy_mix_audios_val.csv \
+#     --split val --arch_frame clip --frame_features cache/clip_feats --out cache/eval_val
+def first(batch):
+    return batch[0]
+
+
+if __name__ == '__main__':
+    parser = ArgParser()
+    # --list_val, --quarantine and --batch_mix are dataset options
+    parser.add_train_arguments()
+    parser.parser.add_argument('--dataset', required=True, choices=['music', 'ave', 'muddy'])
+    parser.parser.add_argument('--root_dir', default='/home/prj/data/Muddy_Mix',
+                               help='Muddy_Mix root')
+    parser.parser.add_argument('--out', required=True)
+    args = parser.parser.parse_args()
+    assert args.split != 'train', 'only the deterministic val/test splits can be materialized'
+
+    if args.dataset == 'music':
+        dataset = MUSICMixDataset(args.list_val, args, split=args.split)
+    elif args.dataset == 'ave':
+        dataset = AVEMixDataset(args.list_val, args, split=args.split)
+    else:
+        dataset = MuddyMixDataset(args.root_dir, args.list_val, args, split=args.split)
+    print('# items: {}'.format(len(dataset)))
+
+    loader = torch.utils.data.DataLoader(
+        dataset, batch_size=1, shuffle=False,
+        num_workers=int(args.workers), collate_fn=first)
+    writer = MaterializedWriter(args.out, len(dataset), args)
+    skipped = 0
+    for i, item in enumerate(loader):
+        if item is None:
+            # failed to load (quarantined Muddy item), left out like the
+            # live val loader does
+            skipped += 1
+            continue
+        writer.add(i - skipped, item)
+        if i % 100 == 0:
+            print('[{}/{}]'.format(i, len(dataset)))
+    writer.close()
+    print('wrote {} ({} items, {} skipped)'.format(args.out, len(dataset) - skipped, skipped))
@@ -0,0 +1,53 @@
+import os
+import sys
+import argparse
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset.frame_pack import write_frame_pack, pack_path
+
+
+# Packs every directory of JPEG frames under --frame_root into a sibling
+# <dir>.fpk file (dataset/frame_pack.py), read by the datasets with
+# --frame_pack 1. The JPEG bytes are copied unchanged.
+#
+# python preprocessing/pack_frames.py --frame_root /home/prj/data/Muddy_Mix --workers 8
+def find_frame_dirs(root):
+    frame_dirs = []
+    for dirpath, _, filenames in os.walk(root):
+        names = sorted(f for f in filenames if f.lower().endswith('.jpg'))
+        if names:
+            frame_dirs.append((dirpath, names))
+    return sorted(frame_dirs)
+
+
+def pack(item):
+    frame_dir, names = item
+    try:
+        return write_frame_pack(frame_dir, names)
+    except Exception as e:
+        print('Failed packing {}: {}'.format(frame_dir, e))
+        return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frame_root', nargs='+', required=True)
+    parser.add_argument('--workers', default=4, type=int)
+    parser.add_argument('--overwrite', action='store_true')
+    args = parser.parse_args()
+
+    frame_dirs = []
+    for root in args.frame_root:
+        frame_dirs += find_frame_dirs(root)
+    if not args.overwrite:
+        frame_dirs = [d for d in frame_dirs if not os.path.exists(pack_path(d[0]))]
+    print('# frame folders to pack: {}'.format(len(frame_dirs)))
+
+    num_frames = 0
+    with Pool(args.workers) as pool:
+        for i, n in enumerate(pool.imap_unordered(pack, frame_dirs, chunksize=16)):
+            num_frames += n
+            if i % 500 == 0:
+                print('[{}/{}] {} frames'.format(i, len(frame_dirs), num_frames))
+    print('packed {} frames'.format(num_frames))